@@ -3,30 +3,35 @@ import re
 import json
 import time
 import hashlib
+import importlib
+import math
+import cProfile
+import pstats
+import random
+import mimetypes
+import shutil
+import socket
+import subprocess
 import threading
-from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-from collections import deque
+import uuid
+import gzip
+from io import BytesIO, StringIO
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from collections import OrderedDict, deque
 from datetime import datetime
 from urllib.parse import quote, urlparse, parse_qs
 
-from flask import Flask, jsonify, request, send_file, render_template
-from PIL import Image, ImageOps
-
-try:
-    import yt_dlp
-except Exception:
-    yt_dlp = None
-
+from flask import Flask, Response, g, jsonify, request, send_file, render_template
+from flask.json.provider import DefaultJSONProvider
 try:
-    import syncedlyrics
+    import orjson
 except Exception:
-    syncedlyrics = None
+    orjson = None
 
 try:
-    from ytmusicapi import YTMusic
+    import brotli
 except Exception:
-    YTMusic = None
+    brotli = None
 
 APP_NAME = "NeoBelieve"
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -44,9 +49,32 @@ CACHE_JSON = os.path.join(DB_DIR, "cache.json")
 DOWNLOADS_JSON = os.path.join(DB_DIR, "downloads.json")
 SETTINGS_JSON = os.path.join(DB_DIR, "settings.json")
 DEVICES_JSON = os.path.join(DB_DIR, "devices.json")
+DOWNLOAD_JOBS_JSON = os.path.join(DB_DIR, "download_jobs.json")
+EXPAND_CACHE_JSON = os.path.join(CACHE_DIR, "expand.json")
+COVER_STORE_JSON = os.path.join(DB_DIR, "covers.json")
+FILL_JOBS_JSON = os.path.join(DB_DIR, "fill_jobs.json")
+
+# DB_PRETTY_JSON=1 pour des fichiers indentés (lisibles, mais plus gros et plus lents).
+DB_PRETTY_JSON = os.getenv("DB_PRETTY_JSON") == "1"
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
 
 CACHE_TTL_SECONDS = 3 * 24 * 60 * 60
 YTDLP_SEARCH_TIMEOUT = 60
+# Délai avant de lancer yt-dlp : une frappe plus récente annule la recherche sans coût réseau.
+SEARCH_DEBOUNCE_SECONDS = 0.25
+SEARCH_RESULTS_TTL = 5 * 60
+SEARCH_RESULTS_MAX = 200
+SUGGEST_TTL = 10 * 60
+SUGGEST_CACHE_MAX = 1000
+SUGGEST_MIN_LOCAL = 5
+# Listes de titres artiste/playlist : servies telles quelles si fraîches,
+# servies puis rafraîchies en arrière-plan si périmées.
+EXPAND_FRESH_SECONDS = 6 * 60 * 60
+EXPAND_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+EXPAND_CACHE_MAX = 300
+EXPAND_LIMIT = 12
 BAD_THUMB_URL = "https://i.ytimg.com/vi/UCgQna2EqpzqzfBjlSmzT72w/hqdefault.jpg"
 BAD_THUMB_HASH = None
 BAD_THUMB_MAX_DIST = 6
@@ -57,14 +85,103 @@ search_metadata_cache = {}
 search_metadata_lock = threading.Lock()
 ytmusic_client = None
 ytmusic_client_lock = threading.Lock()
+search_executor = ThreadPoolExecutor(max_workers=4)
+background_executor = ThreadPoolExecutor(max_workers=2)
+search_lock = threading.Lock()
+# Génération de recherche par client (LRU borné : les ids de clients partis sont oubliés).
+search_generations = OrderedDict()
+SEARCH_CLIENTS_MAX = 1000
+search_inflight = {}
+search_results_cache = OrderedDict()
+suggest_cache = OrderedDict()
+suggest_lock = threading.Lock()
+expand_cache = None
+expand_cache_lock = threading.Lock()
+expand_refreshing = set()
+
+# Les fichiers du cache sont immuables (clé dérivée de l'URL), on peut donc
+# laisser les clients les garder très longtemps.
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+COVER_MAX_AGE = 7 * 24 * 60 * 60
+SEEK_INDEX_STEP = 1.0
+STREAM_CHUNK_SIZE = 64 * 1024
+# "x-accel" (nginx) ou "x-sendfile" (Apache/lighttpd) : Python ne fait que
+# l'autorisation, le proxy envoie les octets.
+SENDFILE_MODE = (os.getenv("SENDFILE_MODE") or "").strip().lower()
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/_media")
+
+# Profilage à la demande (cProfile), activable à chaud via /api/admin/profiling.
+PROFILE_KEEP = 20
+PROFILE_MAX_DEPTH = 64
+PROFILE_MIN_US = 10
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or ""
+profiling = {"rate": float(os.getenv("PROFILE_RATE", "0") or 0), "endpoint": os.getenv("PROFILE_ENDPOINT") or None, "until": None}
+profiling_active = bool(profiling["rate"] or profiling["endpoint"])
+profiling_lock = threading.Lock()
+profile_slot = threading.Lock()
+recent_profiles = deque(maxlen=PROFILE_KEEP)
+
+PORT = int(os.getenv("PORT", "5050"))
+# WARMUP=0 : yt-dlp / ytmusicapi ne sont chargés qu'à la première utilisation.
+WARMUP_ENABLED = os.getenv("WARMUP", "1") != "0"
 
 os.makedirs(DB_DIR, exist_ok=True)
 
+# Dépendances lourdes chargées à la demande (voir _lazy_import).
+lazy_modules = {}
+lazy_modules_lock = threading.Lock()
+
+
+class _FastJSONProvider(DefaultJSONProvider):
+    def _orjson_bytes(self, obj):
+        # Mêmes règles que Flask : dates/UUID/dataclasses via self.default, clés triées.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson_bytes(obj).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Flask appelle toujours dumps() avec indent ou separators : jsonify passerait
+        # par json de la stdlib. Sortie compacte, même en mode debug.
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._orjson_bytes(obj)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = _FastJSONProvider(app)
 
 playback_lock = threading.Lock()
 volume_lock = threading.Lock()
-download_lock = threading.Lock()
+cache_db_lock = threading.RLock()
+downloads_lock = threading.RLock()
+DOWNLOAD_CONCURRENCY = max(1, int(os.getenv("DOWNLOAD_CONCURRENCY", "3")))
+download_slots = threading.BoundedSemaphore(DOWNLOAD_CONCURRENCY)
+
+# Acquisition en deux étapes : réseau (flux audio brut) puis CPU (transcodage ffmpeg).
+NETWORK_CONCURRENCY = max(1, int(os.getenv("NETWORK_CONCURRENCY", "4")))
+TRANSCODE_WORKERS = max(1, int(os.getenv("TRANSCODE_WORKERS", str(os.cpu_count() or 2))))
+MP3_BITRATE = "192k"
+network_slots = threading.BoundedSemaphore(NETWORK_CONCURRENCY)
+transcode_executor = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS)
 
 current_playback = {
     "id": None,
@@ -79,6 +196,106 @@ current_volume = {"volume": 80}
 remote_lock = threading.Lock()
 remote_queue = deque()
 
+# Sondes des devices distants : table de joignabilité servie sans attendre.
+DEVICE_PROBE_INTERVAL = int(os.getenv("DEVICE_PROBE_INTERVAL", "15"))
+DEVICE_PROBE_TIMEOUT = float(os.getenv("DEVICE_PROBE_TIMEOUT", "1.5"))
+DEVICE_PROBE_PATH = "/api/remote/available"
+device_status = {}
+device_status_lock = threading.Lock()
+device_probe_wakeup = threading.Event()
+device_prober_thread = None
+
+cache_fill_lock = threading.Lock()
+cache_fills = {}
+# Remplissages en cours, persistés : les fichiers .part sont repris au lieu d'être refaits.
+FILL_MAX_ATTEMPTS = 3
+FILL_JOB_TTL = CACHE_TTL_SECONDS
+fill_jobs_lock = threading.Lock()
+# PLAY_MODE=stream : lecture via l'URL du flux (proxy), remplissage du cache
+# seulement après STREAM_PROMOTE_SECONDS d'écoute.
+PLAY_MODE = (os.getenv("PLAY_MODE") or "fill").strip().lower()
+STREAM_PROMOTE_SECONDS = int(os.getenv("STREAM_PROMOTE_SECONDS", "30"))
+STREAM_URL_MARGIN = 60
+STREAM_URL_DEFAULT_TTL = 60 * 60
+STREAM_MIMETYPES = {"webm": "audio/webm", "m4a": "audio/mp4", "mp4": "audio/mp4", "opus": "audio/ogg", "mp3": "audio/mpeg"}
+stream_urls = {}
+stream_inflight = {}
+stream_lock = threading.Lock()
+
+# Lyrics : fournisseurs interrogés en parallèle, par ordre de préférence.
+LYRICS_PROVIDERS = ["Lrclib", "Musixmatch", "NetEase", "Megalobiz", "Genius"]
+LYRICS_DEADLINE = float(os.getenv("LYRICS_DEADLINE", "6"))
+LYRICS_MISS_TTL = 24 * 60 * 60
+LRC_TIMESTAMP_RE = re.compile(r"\[\d{1,3}:\d{2}(?:[.:]\d{1,3})?\]")
+lyrics_executor = ThreadPoolExecutor(max_workers=16)
+lyrics_prefetch_executor = ThreadPoolExecutor(max_workers=2)
+lyrics_inflight = {}
+lyrics_lock = threading.Lock()
+lyrics_providers = None
+
+# Radio locale : index construits depuis historique, playlists, cache et téléchargements.
+RADIO_LIMIT = 20
+RADIO_HISTORY_WINDOW = 3
+RADIO_WEIGHT_HISTORY = 3.0
+RADIO_WEIGHT_PLAYLIST = 2.0
+RADIO_WEIGHT_ARTIST = 1.0
+RADIO_WEIGHT_WATCH = 2.0
+RADIO_LOCAL_BOOST = 3.0
+RADIO_MAX_PER_ARTIST = 3
+radio_index = None
+radio_lock = threading.Lock()
+
+# Index mémoire des fichiers audio/pochettes : nom -> (taille, mtime), par dossier.
+INDEXED_DIRS = (CACHE_MUSIC_DIR, MUSIC_DIR, COVERS_DIR)
+file_index = {}
+file_index_lock = threading.Lock()
+json_memo = {}
+json_memo_lock = threading.Lock()
+
+# Pochettes stockées par empreinte du contenu, partagées entre les clés.
+cover_store = None
+cover_store_lock = threading.RLock()
+
+PREFETCH_AHEAD = int(os.getenv("PREFETCH_AHEAD", "5"))
+PREFETCH_CONCURRENCY = max(1, int(os.getenv("PREFETCH_CONCURRENCY", "2")))
+# Budget total en octets/s partagé entre les téléchargements de prefetch (0 = illimité).
+PREFETCH_BANDWIDTH = int(os.getenv("PREFETCH_BANDWIDTH", "0"))
+PREFETCH_RETRY_SECONDS = 300
+# Une file par client ; celles qui ne bougent plus sont oubliées.
+PREFETCH_CLIENTS_MAX = 100
+PREFETCH_CLIENT_TTL = 60 * 60
+# PREFETCH_MODE=head : seul le début des titres à venir est préchargé, la suite au lancement.
+PREFETCH_MODE = (os.getenv("PREFETCH_MODE") or "full").strip().lower()
+PREFETCH_HEAD_SECONDS = int(os.getenv("PREFETCH_HEAD_SECONDS", "15"))
+PREFETCH_HEAD_MAX = int(os.getenv("PREFETCH_HEAD_MAX", "30"))
+# Débit supposé (kbit/s) quand yt-dlp n'annonce ni taille ni débit pour le format.
+PREFETCH_HEAD_KBPS = 160
+PREFETCH_HEAD_TTL = 24 * 60 * 60
+
+download_jobs = {}
+download_jobs_lock = threading.RLock()
+DOWNLOAD_JOBS_TTL = 7 * 24 * 60 * 60
+# Chemins de la bibliothèque réservés par les téléchargements en cours : chemin -> clé.
+download_paths_reserved = {}
+
+playlists_lock = threading.Lock()
+history_lock = threading.Lock()
+HISTORY_MAX_ITEMS = 100
+BATCH_MAX_OPS = 1000
+import_jobs = {}
+import_jobs_lock = threading.Lock()
+IMPORT_CHUNK_SIZE = 100
+IMPORT_PAGE_GROWTH = 4
+# Lectures partielles avant la lecture complète (100 puis 400 titres).
+IMPORT_PAGE_ROUNDS = 2
+IMPORT_JOBS_KEPT = 20
+# Resynchronisation des playlists importées (0 = uniquement à la demande).
+PLAYLIST_SYNC_INTERVAL = int(os.getenv("PLAYLIST_SYNC_INTERVAL", "0"))
+sync_jobs = {}
+sync_jobs_lock = threading.Lock()
+playlist_sync_executor = ThreadPoolExecutor(max_workers=2)
+THUMB_CHECK_WORKERS = 16
+
 
 class _YTDLPLogger:
     def __init__(self):
@@ -95,21 +312,225 @@ class _YTDLPLogger:
             self.errors.append(str(msg))
 
 
+class _UpstreamUnavailable(Exception):
+    pass
+
+
+class _UpstreamHealth:
+    """Disjoncteur + timeout adaptatif (p95 des latences observées) pour un service amont."""
+
+    def __init__(self, name, default_timeout, min_timeout, max_timeout, failure_threshold=5, open_seconds=30):
+        self.name = name
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=100)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.rejected = 0
+
+    def _percentile(self, pct):
+        values = sorted(self.latencies)
+        if not values:
+            return None
+        index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+        return values[index]
+
+    def timeout(self):
+        with self.lock:
+            if len(self.latencies) < 5:
+                return self.default_timeout
+            p95 = self._percentile(95)
+        return max(self.min_timeout, min(self.max_timeout, p95 * 3))
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.open_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probe_in_flight:
+                # Une seule requête de test à la fois en semi-ouvert.
+                self.probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency=None):
+        with self.lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            self.state = "closed"
+
+    def record_failure(self):
+        with self.lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def record_latency(self, latency):
+        # Mesure seule, sans effet sur l'état du disjoncteur.
+        with self.lock:
+            self.latencies.append(latency)
+
+    def release(self):
+        # Appel terminé sans verdict sur la santé du service (ex : vidéo privée).
+        with self.lock:
+            self.probe_in_flight = False
+
+    def snapshot(self):
+        timeout = self.timeout()
+        with self.lock:
+            p50 = self._percentile(50)
+            p95 = self._percentile(95)
+            retry_in = None
+            if self.state == "open":
+                retry_in = max(0, round(self.open_seconds - (time.time() - self.opened_at), 1))
+            return {
+                "state": self.state,
+                "timeout": round(timeout, 2),
+                "p50": round(p50, 3) if p50 is not None else None,
+                "p95": round(p95, 3) if p95 is not None else None,
+                "samples": len(self.latencies),
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "rejected": self.rejected,
+                "retry_in": retry_in,
+            }
+
+
+upstream_health = {
+    "ytdlp": _UpstreamHealth("ytdlp", default_timeout=YTDLP_SEARCH_TIMEOUT, min_timeout=8, max_timeout=YTDLP_SEARCH_TIMEOUT),
+    "ytmusic": _UpstreamHealth("ytmusic", default_timeout=15, min_timeout=3, max_timeout=20),
+    "thumbs": _UpstreamHealth("thumbs", default_timeout=5, min_timeout=1, max_timeout=5),
+}
+
+
+def _is_upstream_error(error):
+    # Erreurs qui révèlent un service amont en difficulté (et pas une vidéo invalide).
+    lower = str(error or "").lower()
+    markers = (
+        "timed out",
+        "timeout",
+        "429",
+        "too many requests",
+        "http error 5",
+        "not a bot",
+        "connection",
+        "temporary failure",
+        "name resolution",
+        "unable to download api page",
+    )
+    return any(marker in lower for marker in markers)
+
+
+class _GuardedClient:
+    """Enveloppe un client (ytmusicapi) : chaque appel passe par le disjoncteur."""
+
+    def __init__(self, client, health):
+        self._client = client
+        self._health = health
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def _call(*args, **kwargs):
+            if not self._health.allow():
+                raise _UpstreamUnavailable(f"{self._health.name} unavailable (circuit open)")
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                if _is_upstream_error(e):
+                    self._health.record_failure()
+                else:
+                    self._health.release()
+                raise
+            self._health.record_success(time.perf_counter() - started)
+            return result
+
+        return _call
+
+
+def _lazy_import(module_name, attr=None):
+    key = (module_name, attr)
+    with lazy_modules_lock:
+        if key in lazy_modules:
+            return lazy_modules[key]
+        try:
+            value = importlib.import_module(module_name)
+            if attr:
+                value = getattr(value, attr)
+        except Exception:
+            value = None
+        lazy_modules[key] = value
+        return value
+
+
 def _load_json(path, default):
     if not os.path.exists(path):
         return default
     try:
+        if orjson is not None:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return default
 
 
+def _load_json_shared(path, default):
+    # Lecture seule : l'objet renvoyé est partagé entre requêtes, ne pas le modifier.
+    try:
+        st = os.stat(path)
+    except OSError:
+        return default
+    stamp = (st.st_mtime_ns, st.st_size)
+    with json_memo_lock:
+        cached = json_memo.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    data = _load_json(path, default)
+    with json_memo_lock:
+        json_memo[path] = (stamp, data)
+    return data
+
+
+def _dump_json_bytes(data):
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if DB_PRETTY_JSON:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            pass
+    if DB_PRETTY_JSON:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
 def _save_json(path, data):
     tmp_path = f"{path}.tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(tmp_path, "wb") as f:
+        f.write(_dump_json_bytes(data))
     os.replace(tmp_path, path)
+    with json_memo_lock:
+        json_memo.pop(path, None)
 
 
 def _safe_title(value):
@@ -167,10 +588,90 @@ def _save_devices(devices):
     _save_json(DEVICES_JSON, devices)
 
 
-def _cache_key(url, title):
+def _probe_device(device):
+    url = f"http://{device.get('host')}:{device.get('port')}{DEVICE_PROBE_PATH}"
+    started = time.perf_counter()
+    status = {"reachable": False, "latency_ms": None, "capabilities": None, "error": None, "checked_at": int(time.time())}
+    try:
+        import requests
+        resp = requests.get(url, timeout=DEVICE_PROBE_TIMEOUT)
+        status["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        status["reachable"] = resp.status_code < 500
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        if isinstance(data, dict) and data.get("available") is not None:
+            status["capabilities"] = {
+                "available": bool(data.get("available")),
+                "device_type": data.get("device_type"),
+                "name": data.get("name"),
+            }
+    except Exception as e:
+        status["error"] = type(e).__name__
+    return status
+
+
+def _probe_all_devices():
+    devices = _load_devices()
+    if not devices:
+        return
+    with ThreadPoolExecutor(max_workers=min(16, len(devices))) as executor:
+        results = list(executor.map(_probe_device, devices))
+    with device_status_lock:
+        # Liste relue : un device retiré pendant la sonde ne revient pas dans la table.
+        known = {d.get("id") for d in _load_devices()}
+        for device, status in zip(devices, results):
+            if device.get("id") not in known:
+                continue
+            previous = device_status.get(device.get("id")) or {}
+            if status["reachable"]:
+                status["last_seen"] = status["checked_at"]
+            else:
+                status["last_seen"] = previous.get("last_seen")
+            device_status[device.get("id")] = status
+        for device_id in list(device_status):
+            if device_id not in known:
+                device_status.pop(device_id, None)
+
+
+def _device_prober_loop():
+    while True:
+        try:
+            _probe_all_devices()
+        except Exception:
+            pass
+        device_probe_wakeup.wait(timeout=DEVICE_PROBE_INTERVAL)
+        device_probe_wakeup.clear()
+
+
+def _ensure_device_prober():
+    global device_prober_thread
+    with device_status_lock:
+        if device_prober_thread is None or not device_prober_thread.is_alive():
+            device_prober_thread = threading.Thread(target=_device_prober_loop, daemon=True)
+            device_prober_thread.start()
+
+
+def _canonical_video_id(url):
+    video_id = _yt_video_id(_normalize_music_url(url))
+    if video_id and re.fullmatch(r"[A-Za-z0-9_-]{11}", video_id):
+        return video_id
+    return None
+
+
+def _legacy_cache_key(url, title):
     return f"{_safe_title(title)}-{_hash_url(url)}"
 
 
+def _cache_key(url, title):
+    # Identité = ID vidéo, quelle que soit la forme de l'URL ou le titre.
+    video_id = _canonical_video_id(url)
+    if video_id:
+        return video_id
+    return _legacy_cache_key(url, title)
+
+
 def _cache_path(key):
     return os.path.join(CACHE_MUSIC_DIR, f"{key}.mp3")
 
@@ -179,61 +680,913 @@ def _download_path(title):
     return os.path.join(MUSIC_DIR, f"{_safe_title(title)}.mp3")
 
 
-def _cover_path(key):
+def _cover_file(digest):
+    return os.path.join(COVERS_DIR, f"{digest}.jpg")
+
+
+def _legacy_cover_path(key):
     return os.path.join(COVERS_DIR, f"{key}.jpg")
 
 
-def _touch_cache_entry(key, entry):
+def _cover_path(key):
+    with cover_store_lock:
+        digest = _load_cover_store()["keys"].get(key)
+    return _cover_file(digest) if digest else _legacy_cover_path(key)
+
+
+def _load_cover_store():
+    # urls : URL source -> empreinte ; keys : clé -> empreinte ; refs : empreinte -> clés.
+    global cover_store
+    if cover_store is None:
+        data = _load_json(COVER_STORE_JSON, {})
+        store = {"urls": dict(data.get("urls") or {}), "keys": dict(data.get("keys") or {}), "refs": {}}
+        for key, digest in store["keys"].items():
+            store["refs"].setdefault(digest, set()).add(key)
+        cover_store = store
+    return cover_store
+
+
+def _save_cover_store(store):
+    _save_json(COVER_STORE_JSON, {"urls": store["urls"], "keys": store["keys"]})
+
+
+def _unref_cover(store, key, digest):
+    refs = store["refs"].get(digest)
+    if refs:
+        refs.discard(key)
+    if refs:
+        return
+    # Plus aucune entrée n'utilise cette image.
+    store["refs"].pop(digest, None)
+    store["urls"] = {u: d for u, d in store["urls"].items() if d != digest}
+    _remove_file(_cover_file(digest))
+
+
+def _link_cover(store, key, digest):
+    previous = store["keys"].get(key)
+    if previous == digest:
+        return
+    store["keys"][key] = digest
+    store["refs"].setdefault(digest, set()).add(key)
+    if previous:
+        _unref_cover(store, key, previous)
+
+
+def _release_cover(key):
+    with cover_store_lock:
+        store = _load_cover_store()
+        digest = store["keys"].pop(key, None)
+        if digest is None:
+            _remove_file(_legacy_cover_path(key))
+            return
+        _unref_cover(store, key, digest)
+        _save_cover_store(store)
+
+
+def _rename_cover_ref(old_key, new_key):
+    with cover_store_lock:
+        store = _load_cover_store()
+        digest = store["keys"].get(old_key)
+        if digest is None:
+            return
+        _link_cover(store, new_key, digest)
+        store["keys"].pop(old_key, None)
+        _unref_cover(store, old_key, digest)
+        _save_cover_store(store)
+
+
+def _adopt_legacy_covers(names, referenced):
+    # Anciennes pochettes "{clé}.jpg" : déplacées dans le stockage par contenu.
+    with cover_store_lock:
+        store = _load_cover_store()
+        changed = False
+        for name in names:
+            stem = name[:-4]
+            if not name.endswith(".jpg") or re.fullmatch(r"[0-9a-f]{32}", stem):
+                continue
+            path = os.path.join(COVERS_DIR, name)
+            if stem not in referenced or stem in store["keys"]:
+                _remove_file(path)
+                continue
+            try:
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:32]
+            except OSError:
+                continue
+            dest = _cover_file(digest)
+            if _file_stat(dest):
+                _remove_file(path)
+            else:
+                try:
+                    os.replace(path, dest)
+                except OSError:
+                    continue
+                _file_index_update(path)
+                _file_index_update(dest)
+            _link_cover(store, stem, digest)
+            changed = True
+        if changed:
+            _save_cover_store(store)
+
+
+def _seek_index_path(key):
+    return os.path.join(CACHE_MUSIC_DIR, f"{key}.seek.json")
+
+
+def _scan_file_index():
+    index = {}
+    for directory in INDEXED_DIRS:
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    try:
+                        if item.is_file():
+                            st = item.stat()
+                            entries[item.name] = (st.st_size, st.st_mtime)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        index[directory] = entries
+    with file_index_lock:
+        file_index.clear()
+        file_index.update(index)
+
+
+def _file_stat(path):
+    # (taille, mtime) sans appel système pour les dossiers indexés, None si absent.
+    if not path:
+        return None
+    directory, name = os.path.split(path)
+    if not file_index:
+        _scan_file_index()
+    with file_index_lock:
+        entries = file_index.get(directory)
+        if entries is not None:
+            return entries.get(name)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def _file_index_update(path):
+    directory, name = os.path.split(path)
+    try:
+        st = os.stat(path)
+        value = (st.st_size, st.st_mtime)
+    except OSError:
+        value = None
+    with file_index_lock:
+        entries = file_index.get(directory)
+        if entries is None:
+            return
+        if value is None:
+            entries.pop(name, None)
+        else:
+            entries[name] = value
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    _file_index_update(path)
+
+
+def _local_track_path(key, entry=None):
+    path = _cache_path(key)
+    if _file_stat(path):
+        return path
+    if entry is None:
+        entry = _load_json_shared(CACHE_JSON, {}).get(key) or {}
+    other = entry.get("path")
+    if other and _file_stat(other):
+        return other
+    return None
+
+
+def _promote_cached_track(key, dest):
+    src = _local_track_path(key)
+    if not src:
+        return False
+    if os.path.abspath(src) == os.path.abspath(dest):
+        return True
+    try:
+        if os.path.exists(dest):
+            os.remove(dest)
+        os.link(src, dest)
+    except OSError:
+        # Autre système de fichiers : copie (le fichier du cache doit rester en place,
+        # l'entrée y revient quand le téléchargement est supprimé).
+        tmp_path = f"{dest}.tmp"
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, dest)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+    finally:
+        _file_index_update(src)
+        _file_index_update(dest)
+    return True
+
+
+def _migrate_cache_keys():
+    with cache_db_lock:
+        renamed = _migrate_cache_entries()
+    if not renamed:
+        return
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+        for item in downloads:
+            new_key = renamed.get(item.get("id"))
+            if new_key:
+                item["id"] = new_key
+                if item.get("cover_path"):
+                    item["cover_path"] = _cover_path(new_key) if os.path.exists(_cover_path(new_key)) else None
+        _save_json(DOWNLOADS_JSON, downloads)
+
+
+def _migrate_cache_entries():
     cache = _load_json(CACHE_JSON, {})
-    cache[key] = entry
-    _save_json(CACHE_JSON, cache)
+    migrated = {}
+    renamed = {}
+    for old_key, entry in cache.items():
+        new_key = _cache_key(entry.get("url"), entry.get("title")) if entry.get("url") else old_key
+        if new_key != old_key:
+            for src, dest in (
+                (_cache_path(old_key), _cache_path(new_key)),
+                (_legacy_cover_path(old_key), _legacy_cover_path(new_key)),
+            ):
+                if os.path.exists(src) and not os.path.exists(dest):
+                    try:
+                        os.replace(src, dest)
+                    except OSError:
+                        pass
+            _rename_cover_ref(old_key, new_key)
+            renamed[old_key] = new_key
+            entry = dict(entry, id=new_key)
+            if entry.get("path") == _cache_path(old_key):
+                entry["path"] = _cache_path(new_key)
+            if entry.get("cover_path"):
+                entry["cover_path"] = _cover_path(new_key) if os.path.exists(_cover_path(new_key)) else None
+        previous = migrated.get(new_key)
+        if previous:
+            # Deux anciennes clés pour le même titre : la plus récente gagne, "downloaded" se cumule.
+            downloaded = bool(previous.get("downloaded") or entry.get("downloaded"))
+            if previous.get("last_played", 0) > entry.get("last_played", 0):
+                entry = previous
+            entry = dict(entry, downloaded=downloaded)
+        migrated[new_key] = entry
+    if renamed:
+        _save_json(CACHE_JSON, migrated)
+    return renamed
+
+
+def _touch_cache_entry(key, entry):
+    # Fusion avec l'entrée existante : les champs absents (durée, pochette...) sont conservés.
+    with cache_db_lock:
+        cache = _load_json(CACHE_JSON, {})
+        entry = dict(cache.get(key) or {}, **entry)
+        cache[key] = entry
+        _save_json(CACHE_JSON, cache)
+    _radio_on_cached(key, entry)
+
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+def _mp3_frame(data, pos):
+    # Renvoie (longueur, échantillons, fréquence) pour une trame MPEG Layer III valide.
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = (data[pos + 2] >> 4) & 0x0F
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    padding = (data[pos + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    if version == 3:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+
+def _build_seek_index(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    offsets = []
+    elapsed = 0.0
+    first = True
+    while pos < len(data):
+        frame = _mp3_frame(data, pos)
+        if frame is None:
+            # Resynchronisation sur le prochain octet 0xFF.
+            nxt = data.find(b"\xff", pos + 1)
+            if nxt < 0:
+                break
+            pos = nxt
+            continue
+        length, samples, sample_rate = frame
+        if first:
+            first = False
+            # La trame Xing/Info de LAME ne contient pas d'audio.
+            if b"Xing" in data[pos:pos + 64] or b"Info" in data[pos:pos + 64]:
+                pos += length
+                continue
+        while len(offsets) * SEEK_INDEX_STEP <= elapsed:
+            offsets.append(pos)
+        elapsed += samples / sample_rate
+        pos += length
+
+    if not offsets:
+        return None
+    return {"version": 1, "size": len(data), "duration": round(elapsed, 3), "step": SEEK_INDEX_STEP, "offsets": offsets}
+
+
+def _write_seek_index(key, path):
+    index = _build_seek_index(path)
+    if index is not None:
+        _save_json(_seek_index_path(key), index)
+    return index
+
+
+def _load_seek_index(key, path):
+    index = _load_json(_seek_index_path(key), None)
+    stat = _file_stat(path)
+    if not stat:
+        return None
+    if not index or index.get("size") != stat[0]:
+        index = _write_seek_index(key, path)
+    return index
+
+
+def _partial_files(key):
+    prefix = f"{key}."
+    try:
+        names = os.listdir(CACHE_MUSIC_DIR)
+    except OSError:
+        return []
+    # Les clés "titre-hash" contiennent un tiret, pas les suffixes yt-dlp.
+    return [
+        name for name in names
+        if name.startswith(prefix) and "-" not in name[len(prefix):] and _is_partial_name(name)
+    ]
+
+
+def _discard_partial_files(key):
+    for name in _partial_files(key):
+        _remove_file(os.path.join(CACHE_MUSIC_DIR, name))
+
+
+def _start_fill_job(key, url, title, artist, cover_url):
+    with fill_jobs_lock:
+        jobs = _load_json(FILL_JOBS_JSON, {})
+        job = jobs.get(key) or {"key": key, "attempts": 0, "created_at": int(time.time())}
+        job.update(
+            url=url,
+            title=title,
+            artist=artist,
+            cover=cover_url,
+            status="running",
+            attempts=job.get("attempts", 0) + 1,
+            updated_at=int(time.time()),
+        )
+        jobs[key] = job
+        _save_json(FILL_JOBS_JSON, jobs)
+        return dict(job)
+
+
+def _finish_fill_job(key, job, error):
+    keep = bool(error) and job["attempts"] < FILL_MAX_ATTEMPTS and bool(_partial_files(key))
+    if not keep:
+        # Succès (restes d'un autre format) ou échec définitif : plus rien à reprendre.
+        _discard_partial_files(key)
+    with fill_jobs_lock:
+        jobs = _load_json(FILL_JOBS_JSON, {})
+        if keep:
+            jobs[key] = dict(job, status="paused", error=error, updated_at=int(time.time()))
+        elif jobs.pop(key, None) is None:
+            return
+        _save_json(FILL_JOBS_JSON, jobs)
+
+
+def _resume_cache_fills():
+    # Remplissages coupés par l'arrêt du serveur : repris là où yt-dlp s'était arrêté.
+    with fill_jobs_lock:
+        jobs = [j for j in _load_json(FILL_JOBS_JSON, {}).values() if j.get("status") == "running"]
+    if not jobs or not _get_online_mode():
+        return
+
+    def _run():
+        for job in jobs:
+            try:
+                _fill_cache(job["url"], job.get("title") or "Track", job.get("artist") or "", job.get("cover"))
+            except Exception:
+                pass
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def _head_prefix(key):
+    # Début du flux source déjà sur disque (prefetch partiel ou remplissage en cours).
+    job = _load_json_shared(FILL_JOBS_JSON, {}).get(key)
+    if not job or not job.get("head_bytes"):
+        return None
+    stat = _file_stat(job.get("head_path") or "")
+    if not stat or stat[0] < job["head_bytes"]:
+        return None
+    return job
+
+
+def _head_size(entry):
+    filesize = entry.get("filesize")
+    duration = entry.get("duration")
+    if filesize and duration:
+        return max(1, min(filesize, int(filesize * PREFETCH_HEAD_SECONDS // duration)))
+    # Taille exacte inconnue (fréquent sur YouTube) : estimation par le débit,
+    # la taille totale est ensuite lue dans le Content-Range de la première requête.
+    kbps = entry.get("bitrate") or PREFETCH_HEAD_KBPS
+    return max(1, int(kbps * 125 * PREFETCH_HEAD_SECONDS))
+
+
+def _prefetch_head(key, item, cancelled, ratelimit=0):
+    with cache_fill_lock:
+        if key in cache_fills:
+            return "fill in progress"
+        # Même registre que _fill_cache : yt-dlp ne reprend pas ce .part pendant qu'on y écrit.
+        event = threading.Event()
+        cache_fills[key] = event
+    try:
+        return _fetch_head(key, item, cancelled, ratelimit)
+    finally:
+        with cache_fill_lock:
+            cache_fills.pop(key, None)
+        event.set()
+
+
+def _fetch_head(key, item, cancelled, ratelimit):
+    url = item.get("url")
+    job = _load_json_shared(FILL_JOBS_JSON, {}).get(key)
+    if job and job.get("status") != "head":
+        # Remplissage interrompu : ses données partielles seront reprises à la lecture.
+        return "fill pending"
+    cover_url = item.get("cover") or _yt_cover_url(_yt_video_id(url))
+    if _is_bad_thumb(cover_url):
+        cover_url = None
+    with network_slots:
+        entry, error = _resolve_stream(key, url, item.get("title") or "Track", item.get("artist") or "", cover_url)
+    if error:
+        return error
+    if not entry.get("format_id") or not entry.get("ext"):
+        return "unknown stream format"
+    size = _head_size(entry)
+    total = entry.get("filesize") or (job or {}).get("total_bytes")
+    # Nom du .part que yt-dlp reprendra pour le même format.
+    path = os.path.join(CACHE_MUSIC_DIR, f"{key}.src.{entry['ext']}.part")
+    if job and job.get("format_id") != entry["format_id"]:
+        _discard_partial_files(key)
+    stat = _file_stat(path) if job else None
+    have = stat[0] if stat else 0
+    if have < size:
+        import requests
+
+        headers = dict(entry["headers"], Range=f"bytes={have}-{size - 1}")
+        try:
+            with network_slots:
+                resp = requests.get(entry["stream_url"], headers=headers, stream=True, timeout=(5, 30))
+                try:
+                    if resp.status_code != 206:
+                        return f"upstream {resp.status_code}"
+                    match = re.search(r"/(\d+)\s*$", resp.headers.get("Content-Range") or "")
+                    if match:
+                        total = total or int(match.group(1))
+                        size = min(size, total)
+                    started = time.monotonic()
+                    written = 0
+                    with open(path, "ab" if have else "wb") as f:
+                        for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                            if cancelled():
+                                raise _PrefetchCancelled(key)
+                            f.write(chunk)
+                            written += len(chunk)
+                            if ratelimit > 0:
+                                # Part du budget PREFETCH_BANDWIDTH, comme le ratelimit de yt-dlp.
+                                ahead = written / ratelimit - (time.monotonic() - started)
+                                if ahead > 0:
+                                    time.sleep(ahead)
+                finally:
+                    resp.close()
+        except Exception as e:
+            if not job:
+                # Sans job enregistré, rien ne garantit le format de ce .part : on ne le garde pas.
+                _remove_file(path)
+            if isinstance(e, _PrefetchCancelled):
+                raise
+            return str(e)
+        finally:
+            _file_index_update(path)
+        stat = _file_stat(path)
+        have = stat[0] if stat else 0
+        if have < size or not total:
+            if not job:
+                _remove_file(path)
+            return "incomplete head" if total else "unknown stream size"
+    if not total:
+        return "unknown stream size"
+    with stream_lock:
+        # Le proxy en a besoin pour répondre depuis le disque (Content-Range).
+        entry["filesize"] = entry.get("filesize") or total
+    with fill_jobs_lock:
+        jobs = _load_json(FILL_JOBS_JSON, {})
+        job = jobs.get(key) or {"key": key, "attempts": 0, "created_at": int(time.time())}
+        job.update(
+            url=url,
+            title=entry["title"],
+            artist=entry["artist"],
+            cover=cover_url,
+            status="head",
+            format_id=entry["format_id"],
+            head_path=path,
+            head_bytes=size,
+            total_bytes=total,
+            updated_at=int(time.time()),
+        )
+        jobs[key] = job
+        _save_json(FILL_JOBS_JSON, jobs)
+    return None
+
+
+def _evict_heads():
+    # Débuts préchargés : durée de vie courte et nombre borné, les plus anciens partent d'abord.
+    now = time.time()
+    with fill_jobs_lock:
+        jobs = _load_json(FILL_JOBS_JSON, {})
+        heads = sorted(
+            (j for j in jobs.values() if j.get("status") == "head"),
+            key=lambda j: j.get("updated_at", 0),
+            reverse=True,
+        )
+        evicted = [
+            j["key"] for rank, j in enumerate(heads)
+            if rank >= PREFETCH_HEAD_MAX or now - j.get("updated_at", 0) > PREFETCH_HEAD_TTL
+        ]
+        for key in evicted:
+            jobs.pop(key)
+        if evicted:
+            _save_json(FILL_JOBS_JSON, jobs)
+    with cache_fill_lock:
+        busy = set(cache_fills)
+    for key in evicted:
+        if key not in busy:
+            _discard_partial_files(key)
+
+
+def _fetch_audio_source(url, key, extra_opts=None, interactive=False):
+    # Étape réseau : flux audio brut, sans post-traitement.
+    outtmpl = os.path.join(CACHE_MUSIC_DIR, f"{key}.src.%(ext)s")
+    if interactive:
+        # Une lecture demandée par l'utilisateur ne fait pas la queue derrière le prefetch.
+        info, error = _yt_dlp_info(url, download=True, outtmpl=outtmpl, extra_opts=extra_opts, transcode=False)
+    else:
+        with network_slots:
+            info, error = _yt_dlp_info(url, download=True, outtmpl=outtmpl, extra_opts=extra_opts, transcode=False)
+    if not info:
+        return None, error
+    for download in info.get("requested_downloads") or []:
+        path = download.get("filepath")
+        if path and os.path.exists(path):
+            return path, None
+    prefix = f"{key}.src."
+    for name in os.listdir(CACHE_MUSIC_DIR):
+        if name.startswith(prefix) and not name.endswith((".part", ".ytdl")):
+            return os.path.join(CACHE_MUSIC_DIR, name), None
+    return None, "download failed"
+
+
+def _transcode_to_mp3(src, dest):
+    # Étape CPU, exécutée dans transcode_executor (taille = nombre de cœurs).
+    if src.lower().endswith(".mp3"):
+        os.replace(src, dest)
+        _file_index_update(dest)
+        return None
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return "ffmpeg not installed"
+    tmp_path = f"{dest}.tmp.mp3"
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", src, "-vn", "-codec:a", "libmp3lame", "-b:a", MP3_BITRATE, tmp_path]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=600)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return str(e)
+    finally:
+        try:
+            os.remove(src)
+        except OSError:
+            pass
+    if proc.returncode != 0:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return (proc.stderr or b"").decode("utf-8", "replace").strip() or "ffmpeg failed"
+    os.replace(tmp_path, dest)
+    _file_index_update(dest)
+    return None
+
+
+def _acquire_track(url, key, extra_opts=None, interactive=False):
+    src, error = _fetch_audio_source(url, key, extra_opts=extra_opts, interactive=interactive)
+    if not src:
+        return error or "download failed"
+    return transcode_executor.submit(_transcode_to_mp3, src, _cache_path(key)).result()
+
+
+def _fill_cache(url, title, artist, cover_url, extra_opts=None, interactive=False):
+    key = _cache_key(url, title)
+    while True:
+        with cache_fill_lock:
+            event = cache_fills.get(key)
+            if event is None:
+                event = threading.Event()
+                cache_fills[key] = event
+                break
+        # Déjà en cours (prefetch ou autre lecture) : on attend le résultat.
+        event.wait()
+        if _local_track_path(key):
+            return key, None
+
+    try:
+        if _local_track_path(key):
+            return key, None
+        job = _start_fill_job(key, url, title, artist, cover_url)
+        if job.get("format_id"):
+            # Début déjà téléchargé (prefetch partiel) : même format, sinon le .part ne se reprend pas.
+            extra_opts = dict(extra_opts or {}, format=job["format_id"])
+        error = _acquire_track(url, key, extra_opts=extra_opts, interactive=interactive)
+        if error or not _file_stat(_cache_path(key)):
+            error = error or "download failed"
+            _finish_fill_job(key, job, error)
+            return key, error
+        _finish_fill_job(key, job, None)
+        seek_index = _write_seek_index(key, _cache_path(key))
+        if cover_url:
+            _save_cover_from_url(cover_url, key)
+        _touch_cache_entry(
+            key,
+            {
+                "id": key,
+                "title": title,
+                "artist": artist,
+                "url": url,
+                "path": _cache_path(key),
+                "cover_path": _cover_path(key) if _file_stat(_cover_path(key)) else None,
+                "duration": seek_index["duration"] if seek_index else None,
+                "last_played": time.time(),
+                "downloaded": False,
+            },
+        )
+        return key, None
+    finally:
+        with cache_fill_lock:
+            cache_fills.pop(key, None)
+        event.set()
 
 
 def _cleanup_cache():
-    cache = _load_json(CACHE_JSON, {})
+    with cache_db_lock:
+        cache = _load_json(CACHE_JSON, {})
+        now = time.time()
+        changed = False
+        for key, entry in list(cache.items()):
+            last_played = entry.get("last_played", 0)
+            downloaded = entry.get("downloaded", False)
+            if downloaded:
+                continue
+            if now - last_played > CACHE_TTL_SECONDS:
+                for stale in (_cache_path(key), _seek_index_path(key)):
+                    _remove_file(stale)
+                # La pochette peut être partagée (même album) : on ne rend que la référence.
+                _release_cover(key)
+                cache.pop(key, None)
+                changed = True
+        if changed:
+            _save_json(CACHE_JSON, cache)
+    _evict_heads()
+
+
+def _is_partial_name(name):
+    # Résidus d'un remplissage interrompu : yt-dlp, ffmpeg ou écriture atomique.
+    return name.endswith((".part", ".ytdl", ".tmp", ".tmp.mp3")) or ".src." in name
+
+
+def _reconcile_storage():
+    # Au démarrage : reconstruit l'index puis aligne le disque et cache.json/downloads.json.
+    _scan_file_index()
+    with file_index_lock:
+        cache_files = dict(file_index.get(CACHE_MUSIC_DIR, {}))
+        music_files = dict(file_index.get(MUSIC_DIR, {}))
+        cover_files = set(file_index.get(COVERS_DIR, {}))
+    with cache_fill_lock:
+        busy = set(cache_fills)
+
+    # Jobs de remplissage encore reprenables ; les autres perdent leurs fichiers partiels.
     now = time.time()
-    changed = False
-    for key, entry in list(cache.items()):
-        last_played = entry.get("last_played", 0)
-        downloaded = entry.get("downloaded", False)
-        if downloaded:
+    with fill_jobs_lock:
+        jobs = _load_json(FILL_JOBS_JSON, {})
+        expired = []
+        for key, job in jobs.items():
+            if key in busy:
+                continue
+            ttl = PREFETCH_HEAD_TTL if job.get("status") == "head" else FILL_JOB_TTL
+            if (
+                not job.get("url")
+                or job.get("attempts", 0) >= FILL_MAX_ATTEMPTS
+                or now - job.get("updated_at", 0) > ttl
+                or _local_track_path(key)
+            ):
+                expired.append(key)
+        for key in expired:
+            jobs.pop(key)
+        if expired:
+            _save_json(FILL_JOBS_JSON, jobs)
+        resumable = busy | set(jobs)
+
+    for name in cache_files:
+        if not _is_partial_name(name):
             continue
-        if now - last_played > CACHE_TTL_SECONDS:
-            path = _cache_path(key)
-            cover = entry.get("cover_path")
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception:
-                    pass
-            if cover and os.path.exists(cover):
-                try:
-                    os.remove(cover)
-                except Exception:
-                    pass
-            cache.pop(key, None)
+        # Une sortie ffmpeg à moitié écrite ne se reprend pas, contrairement au flux yt-dlp.
+        if name.endswith((".tmp", ".tmp.mp3")) or not any(name.startswith(f"{key}.") for key in resumable):
+            _remove_file(os.path.join(CACHE_MUSIC_DIR, name))
+
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+        known = {os.path.basename(d.get("path") or _download_path(d.get("title") or "")) for d in downloads}
+        adopted = []
+        for name, (_, mtime) in music_files.items():
+            stem = name[:-4]
+            if not name.endswith(".mp3") or name in known or _safe_title(stem) != stem:
+                continue
+            adopted.append(
+                {
+                    "id": stem,
+                    "title": stem,
+                    "artist": "",
+                    "url": None,
+                    "path": os.path.join(MUSIC_DIR, name),
+                    "cover_path": None,
+                    "downloaded": True,
+                    "downloaded_at": int(mtime),
+                }
+            )
+        if adopted:
+            _save_json(DOWNLOADS_JSON, downloads + adopted)
+        download_ids = {d.get("id") for d in downloads + adopted}
+
+    with cache_db_lock:
+        cache = _load_json(CACHE_JSON, {})
+        _adopt_legacy_covers(cover_files, set(cache) | download_ids | busy)
+        changed = False
+        for key, entry in list(cache.items()):
+            if key in busy:
+                continue
+            if not _local_track_path(key, entry):
+                cache.pop(key)
+                changed = True
+                continue
+            cover = _cover_path(key) if _file_stat(_cover_path(key)) else None
+            if entry.get("cover_path") != cover:
+                entry["cover_path"] = cover
+                changed = True
+
+        # Fichiers du cache sans entrée : on les réadopte plutôt que de les perdre,
+        # avec les métadonnées de l'historique quand elles existent.
+        known_tracks = {}
+        for item in _load_json(HISTORY_JSON, []):
+            if item.get("url"):
+                known_tracks[_cache_key(item["url"], item.get("title"))] = item
+        for name, (_, mtime) in cache_files.items():
+            if not name.endswith(".mp3") or _is_partial_name(name):
+                continue
+            key = name[:-4]
+            if key in cache or key in busy:
+                continue
+            seek_index = _load_json(_seek_index_path(key), None) or {}
+            meta = known_tracks.get(key) or {}
+            url = meta.get("url")
+            if not url and re.fullmatch(r"[A-Za-z0-9_-]{11}", key):
+                url = f"https://music.youtube.com/watch?v={key}"
+            cache[key] = {
+                "id": key,
+                "title": meta.get("title") or key,
+                "artist": meta.get("artist") or "",
+                "url": url,
+                "path": _cache_path(key),
+                "cover_path": _cover_path(key) if _file_stat(_cover_path(key)) else None,
+                "duration": seek_index.get("duration"),
+                "last_played": mtime,
+                "downloaded": key in download_ids,
+            }
             changed = True
-    if changed:
-        _save_json(CACHE_JSON, cache)
+        if changed:
+            _save_json(CACHE_JSON, cache)
+
+        for name in cache_files:
+            key = name[: -len(".seek.json")]
+            if name.endswith(".seek.json") and key not in cache and key not in busy:
+                _remove_file(os.path.join(CACHE_MUSIC_DIR, name))
+
+        referenced = set(cache) | download_ids | busy
+        with cover_store_lock:
+            store = _load_cover_store()
+            stale = [key for key in store["keys"] if key not in referenced]
+            for key in stale:
+                _unref_cover(store, key, store["keys"].pop(key))
+            if stale:
+                _save_cover_store(store)
+            with file_index_lock:
+                cover_files = list(file_index.get(COVERS_DIR, {}))
+            for name in cover_files:
+                if name.endswith(".jpg") and name[:-4] not in store["refs"]:
+                    _remove_file(os.path.join(COVERS_DIR, name))
 
 
 def _save_cover_from_url(url, key):
     if not url:
         return None
+    with cover_store_lock:
+        store = _load_cover_store()
+        digest = store["urls"].get(url)
+        if digest and _file_stat(_cover_file(digest)):
+            # Image déjà connue (autre titre du même album) : aucune requête réseau.
+            if store["keys"].get(key) != digest:
+                _link_cover(store, key, digest)
+                _save_cover_store(store)
+            return _cover_file(digest)
+    resp = _thumb_request(url)
+    if resp is None or resp.status_code != 200:
+        return None
+    digest = hashlib.sha256(resp.content).hexdigest()[:32]
+    path = _cover_file(digest)
+    with cover_store_lock:
+        store = _load_cover_store()
+        if not _file_stat(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(resp.content)
+            os.replace(tmp_path, path)
+            _file_index_update(path)
+        store["urls"][url] = digest
+        _link_cover(store, key, digest)
+        _save_cover_store(store)
+    return path
+
+
+def _thumb_request(url):
+    health = upstream_health["thumbs"]
+    if not health.allow():
+        return None
+    started = time.perf_counter()
     try:
         import requests
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            path = _cover_path(key)
-            with open(path, "wb") as f:
-                f.write(resp.content)
-            return path
+        resp = requests.get(url, timeout=health.timeout())
     except Exception:
+        health.record_failure()
         return None
-    return None
+    if resp.status_code == 429 or resp.status_code >= 500:
+        health.record_failure()
+    else:
+        health.record_success(time.perf_counter() - started)
+    return resp
 
 
 def _ahash_from_bytes(content):
+    from PIL import Image, ImageOps
     img = Image.open(BytesIO(content))
     img = ImageOps.exif_transpose(img)
     img = img.convert("L").resize((THUMB_HASH_SIZE, THUMB_HASH_SIZE))
@@ -256,11 +1609,10 @@ def _get_thumb_hash(url):
     with thumb_hash_lock:
         if url in thumb_hash_cache:
             return thumb_hash_cache[url]
+    resp = _thumb_request(url)
+    if resp is None or resp.status_code != 200:
+        return None
     try:
-        import requests
-        resp = requests.get(url, timeout=5)
-        if resp.status_code != 200:
-            return None
         h = _ahash_from_bytes(resp.content)
     except Exception:
         return None
@@ -285,39 +1637,55 @@ def _is_bad_thumb(url):
     return _hamming(h, BAD_THUMB_HASH) <= BAD_THUMB_MAX_DIST
 
 
-def _yt_dlp_info(url, download=False, outtmpl=None):
+def _yt_dlp_info(url, download=False, outtmpl=None, extra_opts=None, transcode=True):
+    yt_dlp = _lazy_import("yt_dlp")
     if yt_dlp is None:
         return None, "yt-dlp not installed"
     logger = _YTDLPLogger()
+    health = upstream_health["ytdlp"]
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
         "extract_flat": False,
         "noplaylist": True,
         "logger": logger,
+        # Délai d'inactivité réseau adaptatif : un flux bloqué n'immobilise pas le worker.
+        "socket_timeout": max(5, min(30, health.timeout())),
     }
     if download:
         ydl_opts.update(
             {
                 "format": "bestaudio/best",
                 "outtmpl": outtmpl,
+                # Reprend un .part laissé par un remplissage interrompu.
+                "continuedl": True,
                 "postprocessors": [
                     {
                         "key": "FFmpegExtractAudio",
                         "preferredcodec": "mp3",
                         "preferredquality": "192",
                     }
-                ],
+                ] if transcode else [],
             }
         )
+    if extra_opts:
+        ydl_opts.update(extra_opts)
+    if not health.allow():
+        return None, "YouTube indisponible pour le moment (trop d'échecs récents)."
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=download)
+        # Durée d'un téléchargement complet non comparable à une extraction : pas de latence.
+        health.record_success(None)
         return info, None
     except Exception as e:
         details = str(e)
         if logger.errors:
             details = " | ".join(logger.errors + [details])
+        if _is_upstream_error(details):
+            health.record_failure()
+        else:
+            health.release()
         return None, _friendly_ytdlp_error(details)
 
 
@@ -478,17 +1846,35 @@ def _extract_cover_from_entry(entry, entry_type=None, video_id=None):
 
 def _get_ytmusic_client():
     global ytmusic_client
+    YTMusic = _lazy_import("ytmusicapi", "YTMusic")
     if YTMusic is None:
         return None
     with ytmusic_client_lock:
         if ytmusic_client is None:
             try:
-                ytmusic_client = YTMusic()
+                import requests
+                session = requests.Session()
+                adapter = _make_timeout_adapter(upstream_health["ytmusic"])
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                ytmusic_client = _GuardedClient(YTMusic(requests_session=session), upstream_health["ytmusic"])
             except Exception:
                 ytmusic_client = None
         return ytmusic_client
 
 
+def _make_timeout_adapter(health):
+    from requests.adapters import HTTPAdapter
+
+    class _TimeoutAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            # ytmusicapi n'expose pas de timeout : on l'impose au niveau du transport.
+            kwargs["timeout"] = health.timeout()
+            return super().send(request, **kwargs)
+
+    return _TimeoutAdapter()
+
+
 def _resolve_browse_metadata(entry_id, entry_type):
     if not entry_id or entry_type not in {"artist", "playlist"}:
         return {}
@@ -528,6 +1914,9 @@ def _resolve_browse_metadata(entry_id, entry_type):
                 best = _pick_best_thumbnail(playlist.get("thumbnails"))
                 if best:
                     resolved["cover"] = best.get("url")
+    except _UpstreamUnavailable:
+        # Disjoncteur ouvert : pas de mise en cache d'un résultat vide.
+        return {}
     except Exception:
         resolved = {}
 
@@ -562,6 +1951,9 @@ def _resolve_track_metadata(video_id):
         best = _pick_best_thumbnail(thumbs)
         if best:
             resolved["cover"] = best.get("url")
+    except _UpstreamUnavailable:
+        # Disjoncteur ouvert : pas de mise en cache d'un résultat vide.
+        return {}
     except Exception:
         resolved = {}
 
@@ -670,45 +2062,51 @@ def _track_item(video_id, title, artist, cover=None):
     }
 
 
+def _build_track_items(raw_tracks):
+    # Les miniatures sont vérifiées en parallèle (I/O réseau).
+    if not raw_tracks:
+        return []
+    with ThreadPoolExecutor(max_workers=min(THUMB_CHECK_WORKERS, len(raw_tracks))) as executor:
+        items = list(executor.map(lambda t: _track_item(*t), raw_tracks))
+    return [item for item in items if item]
+
+
+def _playlist_raw_tracks(ytmusic, entry_id, limit=None):
+    raw = []
+    if entry_id.startswith("MPRE"):
+        album = ytmusic.get_album(entry_id)
+        album_title = album.get("title") or ""
+        album_artists = album.get("artists") or []
+        default_artist = ", ".join(a.get("name") for a in album_artists if a.get("name"))
+        for track in (album.get("tracks") or [])[:limit]:
+            artists = track.get("artists") or []
+            artist = ", ".join(a.get("name") for a in artists if a.get("name")) or default_artist
+            thumbs = track.get("thumbnails") or album.get("thumbnails") or []
+            best = _pick_best_thumbnail(thumbs)
+            raw.append((track.get("videoId"), track.get("title"), artist or album_title, best.get("url") if best else None))
+    else:
+        playlist_id = entry_id[2:] if entry_id.startswith("VL") else entry_id
+        # limit=None : ytmusicapi parcourt toutes les pages de la playlist.
+        playlist = ytmusic.get_playlist(playlist_id, limit=limit)
+        playlist_author = playlist.get("author") or ""
+        playlist_thumbs = playlist.get("thumbnails") or []
+        for track in (playlist.get("tracks") or [])[:limit]:
+            artists = track.get("artists") or []
+            artist = ", ".join(a.get("name") for a in artists if a.get("name")) or playlist_author
+            thumbs = track.get("thumbnails") or playlist_thumbs
+            best = _pick_best_thumbnail(thumbs)
+            raw.append((track.get("videoId"), track.get("title"), artist, best.get("url") if best else None))
+    return raw
+
+
 def _resolve_playlist_tracks(entry_id, limit=12):
     ytmusic = _get_ytmusic_client()
     if ytmusic is None:
         return None, "ytmusicapi not installed or unavailable"
 
-    items = []
     try:
-        if entry_id.startswith("MPRE"):
-            album = ytmusic.get_album(entry_id)
-            album_title = album.get("title") or ""
-            album_artists = album.get("artists") or []
-            default_artist = ", ".join(a.get("name") for a in album_artists if a.get("name"))
-            for track in (album.get("tracks") or [])[:limit]:
-                video_id = track.get("videoId")
-                title = track.get("title")
-                artists = track.get("artists") or []
-                artist = ", ".join(a.get("name") for a in artists if a.get("name")) or default_artist
-                thumbs = track.get("thumbnails") or album.get("thumbnails") or []
-                best = _pick_best_thumbnail(thumbs)
-                item = _track_item(video_id, title, artist, cover=best.get("url") if best else None)
-                if item:
-                    if not item.get("artist"):
-                        item["artist"] = album_title
-                    items.append(item)
-        else:
-            playlist_id = entry_id[2:] if entry_id.startswith("VL") else entry_id
-            playlist = ytmusic.get_playlist(playlist_id, limit=limit)
-            playlist_author = playlist.get("author") or ""
-            playlist_thumbs = playlist.get("thumbnails") or []
-            for track in (playlist.get("tracks") or [])[:limit]:
-                video_id = track.get("videoId")
-                title = track.get("title")
-                artists = track.get("artists") or []
-                artist = ", ".join(a.get("name") for a in artists if a.get("name")) or playlist_author
-                thumbs = track.get("thumbnails") or playlist_thumbs
-                best = _pick_best_thumbnail(thumbs)
-                item = _track_item(video_id, title, artist, cover=best.get("url") if best else None)
-                if item:
-                    items.append(item)
+        raw = _playlist_raw_tracks(ytmusic, entry_id, limit=limit)
+        items = _build_track_items(raw)
     except Exception as e:
         return None, _friendly_ytdlp_error(str(e))
     return items, None
@@ -763,10 +2161,525 @@ def _resolve_artist_tracks(entry_id, fallback_title="", limit=12):
     return items, None
 
 
-def _unique_playlist_name(playlists, base_name):
-    base = (base_name or "Playlist").strip() or "Playlist"
-    existing = {p.get("name") for p in playlists}
-    if base not in existing:
+def _update_import_job(job_id, **fields):
+    with import_jobs_lock:
+        job = import_jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _drop_playlist(name):
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        playlists = [p for p in playlists if p.get("name") != name]
+        _save_json(PLAYLIST_JSON, playlists)
+    _invalidate_radio_index()
+
+
+def _run_import_job(job_id, entry_id, name):
+    ytmusic = _get_ytmusic_client()
+    if ytmusic is None:
+        _drop_playlist(name)
+        _update_import_job(job_id, status="error", error="ytmusicapi not installed or unavailable")
+        return
+    state = {"processed": 0}
+
+    def _publish(tracks):
+        for start in range(0, len(tracks), IMPORT_CHUNK_SIZE):
+            chunk = tracks[start:start + IMPORT_CHUNK_SIZE]
+            items = _build_track_items(chunk)
+            with playlists_lock:
+                playlists = _load_json(PLAYLIST_JSON, [])
+                target = next((p for p in playlists if p.get("name") == name), None)
+                if target is None:
+                    _update_import_job(job_id, status="error", error="playlist removed")
+                    return False
+                seen = {i.get("id") for i in target.get("items", [])}
+                for item in items:
+                    if item["id"] in seen:
+                        continue
+                    seen.add(item["id"])
+                    target.setdefault("items", []).append(item)
+                    _radio_on_playlist_add(name, item)
+                count = len(target["items"])
+                _save_json(PLAYLIST_JSON, playlists)
+            state["processed"] += len(chunk)
+            _update_import_job(job_id, done=state["processed"], count=count)
+        return True
+
+    # Pagination progressive : la première page est publiée avant de demander la suite.
+    # ytmusicapi n'expose pas ses jetons de continuation, chaque lecture repart du début :
+    # IMPORT_PAGE_ROUNDS lectures partielles, puis une lecture complète. Le surcoût est
+    # borné à la somme des limites partielles (500 titres relus), quelle que soit la taille.
+    raw = []
+    limit = IMPORT_CHUNK_SIZE
+    rounds = 0
+    while True:
+        try:
+            page = _playlist_raw_tracks(ytmusic, entry_id, limit=limit)
+        except Exception as e:
+            if not raw:
+                _drop_playlist(name)
+            _update_import_job(job_id, status="error", error=_friendly_ytdlp_error(str(e)))
+            return
+        if not page and not raw:
+            _drop_playlist(name)
+            _update_import_job(job_id, status="error", error="empty playlist")
+            return
+        fresh = page[len(raw):]
+        complete = limit is None or len(page) < limit or entry_id.startswith("MPRE") or not fresh
+        raw = page
+        if complete:
+            _update_import_job(job_id, total=len(raw))
+        if not _publish(fresh):
+            return
+        if complete:
+            break
+        rounds += 1
+        limit = limit * IMPORT_PAGE_GROWTH if rounds < IMPORT_PAGE_ROUNDS else None
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        target = next((p for p in playlists if p.get("name") == name), None)
+        if target is not None:
+            # Référence pour les synchronisations suivantes.
+            target["source_ids"] = list(dict.fromkeys(t[0] for t in raw if t[0]))
+            target["synced_at"] = int(time.time())
+            _save_json(PLAYLIST_JSON, playlists)
+    _update_import_job(job_id, status="done", finished_at=int(time.time()))
+
+
+def _start_import_job(entry_id, name):
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "id": job_id,
+        "source": entry_id,
+        "name": name,
+        "status": "running",
+        "total": None,
+        "done": 0,
+        "count": 0,
+        "error": None,
+        "started_at": int(time.time()),
+    }
+    with import_jobs_lock:
+        import_jobs[job_id] = job
+        finished = [j for j in import_jobs.values() if j["status"] != "running"]
+        finished.sort(key=lambda j: j["started_at"])
+        for old in finished[:max(0, len(import_jobs) - IMPORT_JOBS_KEPT)]:
+            import_jobs.pop(old["id"], None)
+    threading.Thread(target=_run_import_job, args=(job_id, entry_id, name), daemon=True).start()
+    return job_id
+
+
+def _import_running(name):
+    with import_jobs_lock:
+        return any(j["name"] == name and j["status"] == "running" for j in import_jobs.values())
+
+
+def _sync_playlist(name):
+    if _import_running(name):
+        # source_ids n'est écrit qu'à la fin de l'import.
+        return None, "import in progress"
+    with playlists_lock:
+        target = next((p for p in _load_json(PLAYLIST_JSON, []) if p.get("name") == name), None)
+    if target is None:
+        return None, "playlist not found"
+    source = target.get("source")
+    if not source:
+        return None, "playlist has no source"
+    ytmusic = _get_ytmusic_client()
+    if ytmusic is None:
+        return None, "ytmusicapi not installed or unavailable"
+    try:
+        raw = _playlist_raw_tracks(ytmusic, source, limit=None)
+    except Exception as e:
+        return None, _friendly_ytdlp_error(str(e))
+
+    raw_by_id = {}
+    for track in raw:
+        if track[0] and track[0] not in raw_by_id:
+            raw_by_id[track[0]] = track
+    remote_ids = list(raw_by_id)
+    # Seuls les nouveaux titres passent par la validation des miniatures.
+    known = {i.get("id") for i in target.get("items", [])} | set(target.get("source_ids") or [])
+    new_items = {item["id"]: item for item in _build_track_items([raw_by_id[v] for v in remote_ids if v not in known])}
+
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        target = next((p for p in playlists if p.get("name") == name), None)
+        if target is None:
+            return None, "playlist removed"
+        items = target.get("items", [])
+        by_id = {i.get("id"): i for i in items}
+        remote_set = set(remote_ids)
+        previous_source = set(target.get("source_ids") or [])
+        # Diff à trois : déjà dans la source à la dernière synchro mais absent localement
+        # = retiré par l'utilisateur, on ne le remet pas.
+        removed_locally = previous_source - set(by_id)
+        merged = [by_id.get(v) or new_items.get(v) for v in remote_ids if v not in removed_locally]
+        merged = [i for i in merged if i]
+        # Titres ajoutés à la main (jamais présents dans la source) : conservés en fin de liste.
+        merged.extend(i for i in items if i.get("id") not in remote_set and i.get("id") not in previous_source)
+        merged_ids = {i.get("id") for i in merged}
+        kept_before = [i.get("id") for i in items if i.get("id") in remote_set]
+        kept_after = [v for v in remote_ids if v in by_id]
+        result = {
+            "added": sum(1 for i in merged if i.get("id") not in by_id),
+            "removed": sum(1 for i in items if i.get("id") not in merged_ids),
+            "moved": sum(1 for a, b in zip(kept_before, kept_after) if a != b),
+            "count": len(merged),
+        }
+        changed = result["added"] or result["removed"] or result["moved"]
+        if changed:
+            target["items"] = merged
+        target["source_ids"] = remote_ids
+        target["synced_at"] = int(time.time())
+        _save_json(PLAYLIST_JSON, playlists)
+    if changed:
+        _invalidate_radio_index()
+    return result, None
+
+
+def _run_sync_job(name):
+    with sync_jobs_lock:
+        sync_jobs[name]["status"] = "running"
+    try:
+        result, error = _sync_playlist(name)
+    except Exception as e:
+        result, error = None, str(e)
+    with sync_jobs_lock:
+        job = sync_jobs[name]
+        job.update(result or {})
+        job.update(status="error" if error else "done", error=error, finished_at=int(time.time()))
+
+
+def _start_sync_job(name):
+    with sync_jobs_lock:
+        job = sync_jobs.get(name)
+        if job and job["status"] in {"pending", "running"}:
+            return dict(job)
+        job = {"name": name, "status": "pending", "error": None, "started_at": int(time.time()), "finished_at": None}
+        sync_jobs[name] = job
+    playlist_sync_executor.submit(_run_sync_job, name)
+    return dict(job)
+
+
+def _playlist_sync_loop():
+    while True:
+        if _get_online_mode():
+            now = time.time()
+            with playlists_lock:
+                playlists = _load_json(PLAYLIST_JSON, [])
+            for playlist in playlists:
+                if not playlist.get("source") or _import_running(playlist["name"]):
+                    continue
+                if now - playlist.get("synced_at", 0) >= PLAYLIST_SYNC_INTERVAL:
+                    _start_sync_job(playlist["name"])
+        time.sleep(min(PLAYLIST_SYNC_INTERVAL, 600))
+
+
+def _load_expand_cache():
+    global expand_cache
+    if expand_cache is None:
+        entries = _load_json(EXPAND_CACHE_JSON, {})
+        ordered = sorted(entries.items(), key=lambda kv: kv[1].get("used_at", 0))
+        expand_cache = OrderedDict(ordered)
+    return expand_cache
+
+
+def _store_expanded(cache_key, items):
+    now = time.time()
+    with expand_cache_lock:
+        cache = _load_expand_cache()
+        cache[cache_key] = {"items": items, "fetched_at": now, "used_at": now}
+        cache.move_to_end(cache_key)
+        while len(cache) > EXPAND_CACHE_MAX:
+            cache.popitem(last=False)
+        _save_json(EXPAND_CACHE_JSON, dict(cache))
+
+
+def _resolve_watch_tracks(video_id, limit=25):
+    # "Radio" YouTube Music d'un titre (get_watch_playlist), hors titre de départ.
+    ytmusic = _get_ytmusic_client()
+    if ytmusic is None:
+        return None, "ytmusicapi not installed or unavailable"
+    try:
+        watch = ytmusic.get_watch_playlist(videoId=video_id, limit=limit)
+        raw = []
+        for track in watch.get("tracks") or []:
+            if track.get("videoId") == video_id:
+                continue
+            artists = track.get("artists") or []
+            artist = ", ".join(a.get("name") for a in artists if a.get("name"))
+            best = _pick_best_thumbnail(track.get("thumbnail") or track.get("thumbnails") or [])
+            raw.append((track.get("videoId"), track.get("title"), artist, best.get("url") if best else None))
+        items = _build_track_items(raw[:limit])
+    except Exception as e:
+        return None, _friendly_ytdlp_error(str(e))
+    return items, None
+
+
+def _fetch_expanded(entry_type, entry_id, title):
+    if entry_type == "artist":
+        return _resolve_artist_tracks(entry_id, fallback_title=title, limit=EXPAND_LIMIT)
+    if entry_type == "watch":
+        return _resolve_watch_tracks(entry_id)
+    return _resolve_playlist_tracks(entry_id, limit=EXPAND_LIMIT)
+
+
+def _refresh_expanded(entry_type, entry_id, title):
+    cache_key = f"{entry_type}:{entry_id}"
+    try:
+        items, _ = _fetch_expanded(entry_type, entry_id, title)
+        if items:
+            _store_expanded(cache_key, items)
+    finally:
+        with expand_cache_lock:
+            expand_refreshing.discard(cache_key)
+
+
+def _get_expanded_tracks(entry_type, entry_id, title, online=True):
+    cache_key = f"{entry_type}:{entry_id}"
+    now = time.time()
+    with expand_cache_lock:
+        entry = _load_expand_cache().get(cache_key)
+        if entry is not None:
+            entry["used_at"] = now
+            expand_cache.move_to_end(cache_key)
+    if entry is not None:
+        age = now - entry.get("fetched_at", 0)
+        if age < EXPAND_FRESH_SECONDS:
+            return entry["items"], None, "fresh"
+        if not online:
+            return entry["items"], None, "stale"
+        if age < EXPAND_MAX_AGE_SECONDS:
+            with expand_cache_lock:
+                start = cache_key not in expand_refreshing
+                expand_refreshing.add(cache_key)
+            if start:
+                threading.Thread(target=_refresh_expanded, args=(entry_type, entry_id, title), daemon=True).start()
+            return entry["items"], None, "stale"
+    if not online:
+        return None, "offline", "miss"
+
+    items, error = _fetch_expanded(entry_type, entry_id, title)
+    if items is None:
+        if entry is not None:
+            # Échec du rafraîchissement : mieux vaut l'ancienne liste que rien.
+            return entry["items"], None, "stale"
+        return None, error, "miss"
+    if items:
+        _store_expanded(cache_key, items)
+    return items, None, "miss"
+
+
+def _radio_key(item):
+    if not isinstance(item, dict):
+        return None
+    if item.get("url"):
+        return _cache_key(item["url"], item.get("title"))
+    return item.get("id")
+
+
+def _artist_names(artist):
+    parts = re.split(r",|&| feat\.? | ft\.? ", (artist or "").lower())
+    return {p.strip() for p in parts if p.strip()}
+
+
+def _radio_add_track(index, key, item):
+    known = index["tracks"].setdefault(key, {"id": key})
+    for field in ("title", "artist", "url", "cover"):
+        if item.get(field) and not known.get(field):
+            known[field] = item[field]
+    for name in _artist_names(item.get("artist")):
+        index["artists"].setdefault(name, set()).add(key)
+
+
+def _radio_note_played(index, key):
+    # Co-occurrence avec les derniers titres joués, pondérée par la distance.
+    recent = index["recent"]
+    if recent and recent[-1] == key:
+        return
+    for distance, other in enumerate(reversed(recent), start=1):
+        if other == key:
+            continue
+        weight = 1.0 / distance
+        for a, b in ((other, key), (key, other)):
+            row = index["cooccur"].setdefault(a, {})
+            row[b] = row.get(b, 0.0) + weight
+    recent.append(key)
+
+
+def _build_radio_index():
+    index = {"tracks": {}, "artists": {}, "cooccur": {}, "playlists": {}, "members": {}, "recent": deque(maxlen=RADIO_HISTORY_WINDOW)}
+    for entry in list(_load_json_shared(CACHE_JSON, {}).values()) + _load_json_shared(DOWNLOADS_JSON, []):
+        if entry.get("id"):
+            _radio_add_track(index, entry["id"], entry)
+    for playlist in _load_json_shared(PLAYLIST_JSON, []):
+        name = playlist.get("name")
+        for item in playlist.get("items") or []:
+            key = _radio_key(item)
+            if key:
+                _radio_add_track(index, key, item)
+                index["playlists"].setdefault(key, set()).add(name)
+                index["members"].setdefault(name, set()).add(key)
+    history = sorted(_load_json_shared(HISTORY_JSON, []), key=lambda h: h.get("played_at", 0))
+    for item in history:
+        key = _radio_key(item)
+        if key:
+            _radio_add_track(index, key, item)
+            _radio_note_played(index, key)
+    return index
+
+
+def _get_radio_index():
+    global radio_index
+    with radio_lock:
+        if radio_index is None:
+            radio_index = _build_radio_index()
+        return radio_index
+
+
+def _invalidate_radio_index():
+    # Suppressions et réécritures en masse : reconstruction paresseuse au prochain appel.
+    global radio_index
+    with radio_lock:
+        radio_index = None
+
+
+def _radio_on_play(item):
+    key = _radio_key(item)
+    if not key:
+        return
+    with radio_lock:
+        if radio_index is not None:
+            _radio_add_track(radio_index, key, item)
+            _radio_note_played(radio_index, key)
+
+
+def _radio_on_playlist_add(name, item):
+    key = _radio_key(item)
+    if not key:
+        return
+    with radio_lock:
+        if radio_index is not None:
+            _radio_add_track(radio_index, key, item)
+            radio_index["playlists"].setdefault(key, set()).add(name)
+            radio_index["members"].setdefault(name, set()).add(key)
+
+
+def _radio_on_cached(key, entry):
+    with radio_lock:
+        if radio_index is not None:
+            _radio_add_track(radio_index, key, entry)
+
+
+def _radio_watch_items(seed, online):
+    # Réponses get_watch_playlist déjà en cache ; rafraîchies en arrière-plan seulement.
+    video_id = _canonical_video_id(seed.get("url"))
+    if not video_id:
+        return []
+    items, _, state = _get_expanded_tracks("watch", video_id, seed.get("title") or "", online=False)
+    if online and state != "fresh":
+        cache_key = f"watch:{video_id}"
+        with expand_cache_lock:
+            start = cache_key not in expand_refreshing
+            expand_refreshing.add(cache_key)
+        if start:
+            background_executor.submit(_refresh_expanded, "watch", video_id, seed.get("title") or "")
+    return items or []
+
+
+def _radio_candidates(seeds, exclude, limit, local_only=False, online=False):
+    seed_keys = [k for k in (_radio_key(s) for s in seeds) if k]
+    watch = _radio_watch_items(seeds[0], online) if seeds else []
+    scores = {}
+
+    def _add(key, value):
+        scores[key] = scores.get(key, 0.0) + value
+
+    index = _get_radio_index()
+    with radio_lock:
+        for item in watch:
+            key = _radio_key(item)
+            if key:
+                _radio_add_track(index, key, item)
+        # Le titre en cours compte le plus, les précédents de moins en moins.
+        for rank, seed in enumerate(seed_keys):
+            weight = 0.5 ** rank
+            for other, count in index["cooccur"].get(seed, {}).items():
+                _add(other, RADIO_WEIGHT_HISTORY * count * weight)
+            for name in index["playlists"].get(seed, ()):
+                members = index["members"].get(name, ())
+                share = RADIO_WEIGHT_PLAYLIST * weight / math.log2(len(members) + 1)
+                for other in members:
+                    _add(other, share)
+            track = index["tracks"].get(seed) or {}
+            for name in _artist_names(track.get("artist")):
+                for other in index["artists"].get(name, ()):
+                    _add(other, RADIO_WEIGHT_ARTIST * weight)
+        for position, item in enumerate(watch):
+            key = _radio_key(item)
+            if key:
+                _add(key, RADIO_WEIGHT_WATCH * (1 - position / len(watch)))
+        if not scores:
+            # Démarrage à froid : les derniers titres joués ou mis en cache.
+            for position, key in enumerate(reversed(index["recent"])):
+                _add(key, 1.0 / (position + 1))
+        tracks = {key: dict(index["tracks"].get(key) or {"id": key}) for key in scores}
+
+    ranked = []
+    for key, score in scores.items():
+        track = tracks[key]
+        if key in exclude or key in seed_keys or not track.get("url"):
+            continue
+        cached = _local_track_path(key) is not None
+        if local_only and not cached:
+            continue
+        # Un titre déjà sur disque garantit une lecture immédiate, même hors ligne.
+        ranked.append((score * (RADIO_LOCAL_BOOST if cached else 1.0), key, cached))
+    ranked.sort(reverse=True)
+
+    items = []
+    per_artist = {}
+    deferred = []
+    for score, key, cached in ranked:
+        track = tracks[key]
+        artist = (track.get("artist") or "").lower()
+        if per_artist.get(artist, 0) >= RADIO_MAX_PER_ARTIST:
+            deferred.append((score, key, cached))
+            continue
+        per_artist[artist] = per_artist.get(artist, 0) + 1
+        items.append((score, key, cached))
+        if len(items) >= limit:
+            break
+    items.extend(deferred[: max(0, limit - len(items))])
+
+    results = []
+    for score, key, cached in items:
+        track = tracks[key]
+        cover = track.get("cover")
+        if not cover and _file_stat(_cover_path(key)):
+            cover = f"/api/cover?key={quote(key)}"
+        results.append(
+            {
+                "id": key,
+                "title": track.get("title") or key,
+                "artist": track.get("artist") or "",
+                "url": track["url"],
+                "cover": cover,
+                "type": "track",
+                "cached": cached,
+                "score": round(score, 3),
+            }
+        )
+    return results
+
+
+def _unique_playlist_name(playlists, base_name):
+    base = (base_name or "Playlist").strip() or "Playlist"
+    existing = {p.get("name") for p in playlists}
+    if base not in existing:
         return base
     i = 2
     while True:
@@ -776,9 +2689,43 @@ def _unique_playlist_name(playlists, base_name):
         i += 1
 
 
-def _yt_dlp_search(query, limit=10):
+def _store_search_result(cache_key, future, started):
+    health = upstream_health["ytdlp"]
+    error = None if future.cancelled() else future.exception()
+    with search_lock:
+        # Un seul verdict par appel : le délai dépassé a déjà été compté comme échec.
+        counted = getattr(future, "timed_out", False)
+        future.settled = True
+    if counted:
+        # Réponse tardive : ni succès ni échec supplémentaire, mais la latence reste utile.
+        if not future.cancelled() and error is None:
+            health.record_latency(time.perf_counter() - started)
+    elif future.cancelled():
+        health.release()
+    elif error is not None:
+        if _is_upstream_error(error):
+            health.record_failure()
+        else:
+            health.release()
+    else:
+        health.record_success(time.perf_counter() - started)
+    with search_lock:
+        search_inflight.pop(cache_key, None)
+        if future.cancelled() or error is not None:
+            return
+        info = future.result() or {}
+        search_results_cache[cache_key] = (time.time(), info.get("entries", []))
+        search_results_cache.move_to_end(cache_key)
+        while len(search_results_cache) > SEARCH_RESULTS_MAX:
+            search_results_cache.popitem(last=False)
+
+
+def _yt_dlp_search(query, limit=10, is_current=None):
+    yt_dlp = _lazy_import("yt_dlp")
     if yt_dlp is None:
         return None, "yt-dlp not installed"
+    health = upstream_health["ytdlp"]
+    timeout = health.timeout()
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
@@ -786,7 +2733,7 @@ def _yt_dlp_search(query, limit=10):
         "skip_download": True,
         "lazy_playlist": True,
         "playlistend": limit,
-        "socket_timeout": 10,
+        "socket_timeout": max(5, min(10, timeout)),
         "retries": 1,
         "extractor_retries": 1,
         "noplaylist": False,
@@ -796,32 +2743,861 @@ def _yt_dlp_search(query, limit=10):
     def _do_search():
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             return ydl.extract_info(search, download=False)
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(_do_search)
+
+    cache_key = (query.strip().lower(), limit)
+    owner = False
+    superseded = is_current is not None and not is_current()
+    with search_lock:
+        cached = search_results_cache.get(cache_key)
+        if cached and time.time() - cached[0] < SEARCH_RESULTS_TTL:
+            return cached[1], None
+        # Même requête déjà en cours (autre client) : on partage le résultat.
+        future = search_inflight.get(cache_key)
+        if future is None:
+            if superseded:
+                # Une frappe plus récente existe : inutile de lancer l'extraction.
+                return None, "superseded"
+            if not health.allow():
+                # Service amont en difficulté : résultat périmé plutôt qu'une attente inutile.
+                if cached:
+                    return cached[1], None
+                return None, "YouTube indisponible pour le moment (trop d'échecs récents)."
+            started = time.perf_counter()
+            future = search_executor.submit(_do_search)
+            search_inflight[cache_key] = future
+            owner = True
+    if owner:
+        # Hors du verrou : un future déjà terminé exécute le callback immédiatement, ici même.
+        future.add_done_callback(lambda f: _store_search_result(cache_key, f, started))
+
+    deadline = time.time() + timeout
+    while True:
         try:
-            info = future.result(timeout=YTDLP_SEARCH_TIMEOUT)
-            return info.get("entries", []), None
+            info = future.result(timeout=0.1)
+            return (info or {}).get("entries", []), None
         except FuturesTimeoutError:
-            return None, f"timeout after {YTDLP_SEARCH_TIMEOUT}s"
+            if is_current is not None and not is_current():
+                # Le résultat finira dans le cache, la requête HTTP rend la main tout de suite.
+                return None, "superseded"
+            if time.time() >= deadline:
+                with search_lock:
+                    first = not getattr(future, "settled", False) and not getattr(future, "timed_out", False)
+                    if first:
+                        future.timed_out = True
+                if first:
+                    health.record_failure()
+                return None, f"timeout after {round(timeout)}s"
         except Exception as e:
             return None, str(e)
 
 
-def _add_history(item):
-    history = _load_json(HISTORY_JSON, [])
+def _begin_search(client_id):
+    with search_lock:
+        generation = search_generations.get(client_id, 0) + 1
+        search_generations[client_id] = generation
+        search_generations.move_to_end(client_id)
+        while len(search_generations) > SEARCH_CLIENTS_MAX:
+            search_generations.popitem(last=False)
+
+    def _is_current():
+        with search_lock:
+            return search_generations.get(client_id) == generation
+
+    return _is_current
+
+
+def _suggest_from_cache(prefix):
+    now = time.time()
+    with suggest_lock:
+        cached = suggest_cache.get(prefix)
+        if cached and now - cached[0] < SUGGEST_TTL:
+            suggest_cache.move_to_end(prefix)
+            return cached[1]
+        # Une liste en cache pour un préfixe plus court suffit souvent.
+        for end in range(len(prefix) - 1, 0, -1):
+            shorter = suggest_cache.get(prefix[:end])
+            if not shorter or now - shorter[0] >= SUGGEST_TTL:
+                continue
+            matches = [sugg for sugg in shorter[1] if sugg.lower().startswith(prefix)]
+            if len(matches) >= SUGGEST_MIN_LOCAL:
+                return matches
+            break
+    return None
+
+
+def _get_search_suggestions(query):
+    prefix = " ".join(query.lower().split())
+    if not prefix:
+        return [], None
+    cached = _suggest_from_cache(prefix)
+    if cached is not None:
+        return cached, None
+
+    ytmusic = _get_ytmusic_client()
+    if ytmusic is None:
+        return None, "ytmusicapi not installed or unavailable"
+    try:
+        suggestions = [sugg for sugg in ytmusic.get_search_suggestions(prefix) if isinstance(sugg, str)]
+    except Exception as e:
+        return None, _friendly_ytdlp_error(str(e))
+
+    with suggest_lock:
+        suggest_cache[prefix] = (time.time(), suggestions)
+        suggest_cache.move_to_end(prefix)
+        while len(suggest_cache) > SUGGEST_CACHE_MAX:
+            suggest_cache.popitem(last=False)
+    return suggestions, None
+
+
+def _lyrics_cache_path(title, artist):
+    return os.path.join(CACHE_LYRICS_DIR, f"{_safe_title(f'{title}-{artist}')}.json")
+
+
+def _get_lyrics_providers():
+    # syncedlyrics.search() avale les erreurs des fournisseurs : on appelle leurs classes
+    # directement. Instances partagées (chaque constructeur ajoute un handler de log).
+    global lyrics_providers
+    module = _lazy_import("syncedlyrics.providers")
+    if module is None:
+        return None
+    with lyrics_lock:
+        if lyrics_providers is None:
+            providers = {}
+            for name in LYRICS_PROVIDERS:
+                try:
+                    provider = getattr(module, name)()
+                except Exception:
+                    continue
+                session = getattr(provider, "session", None)
+                if session is not None:
+                    session.request = _bounded_request(session.request)
+                providers[name] = provider
+            lyrics_providers = providers
+        return lyrics_providers
+
+
+def _bounded_request(request_func):
+    # Un appel encore en vol à l'échéance ne peut pas être annulé : chaque requête HTTP
+    # est bornée pour que le thread de lyrics_executor soit rendu rapidement.
+    def _request(method, url, **kwargs):
+        kwargs["timeout"] = (2, LYRICS_DEADLINE)
+        return request_func(method, url, **kwargs)
+
+    return _request
+
+
+def _race_lyrics(title, artist):
+    # Tous les fournisseurs en même temps : le premier LRC synchronisé gagne,
+    # sinon le meilleur texte brut reçu avant l'échéance.
+    providers = _get_lyrics_providers()
+    if providers is None:
+        return None, "syncedlyrics not installed"
+    term = f"{title} {artist}".strip()
+
+    def _query(name):
+        return name, providers[name].get_lrc(term)
+
+    futures = [lyrics_executor.submit(_query, name) for name in LYRICS_PROVIDERS if name in providers]
+    plain = {}
+    answered = 0
+    try:
+        for future in as_completed(futures, timeout=LYRICS_DEADLINE):
+            try:
+                name, found = future.result()
+            except Exception:
+                continue
+            answered += 1
+            synced = getattr(found, "synced", None)
+            if synced and LRC_TIMESTAMP_RE.search(synced):
+                return {"synced": synced, "plain": None, "provider": name}, None
+            text = getattr(found, "unsynced", None) or synced
+            if text and text.strip():
+                plain[name] = text
+    except FuturesTimeoutError:
+        pass
+    finally:
+        for future in futures:
+            future.cancel()
+    for name in LYRICS_PROVIDERS:
+        if name in plain:
+            return {"synced": None, "plain": plain[name], "provider": name}, None
+    if not answered:
+        # Aucune réponse exploitable : ne pas mémoriser une absence de lyrics.
+        return None, "lyrics providers unavailable"
+    return {"synced": None, "plain": None, "provider": None}, None
+
+
+def _lyrics_is_fresh(data):
+    if data.get("synced") or data.get("plain"):
+        return True
+    # Absence de lyrics mémorisée, réessayée après LYRICS_MISS_TTL.
+    return time.time() - data.get("fetched_at", 0) < LYRICS_MISS_TTL
+
+
+def _get_lyrics(title, artist):
+    path = _lyrics_cache_path(title, artist)
+    data = _load_json(path, None)
+    if data and (_lyrics_is_fresh(data) or not _get_online_mode()):
+        return data, None, True
+    if not _get_online_mode():
+        return None, "offline", False
+
+    with lyrics_lock:
+        future = lyrics_inflight.get(path)
+        owner = future is None
+        if owner:
+            future = Future()
+            lyrics_inflight[path] = future
+    if not owner:
+        # Même titre déjà demandé (prefetch ou autre client) : on partage le résultat.
+        try:
+            return future.result(timeout=LYRICS_DEADLINE + 1) + (False,)
+        except FuturesTimeoutError:
+            return None, "timeout", False
+
+    result = (None, "lyrics failed")
+    try:
+        found, error = _race_lyrics(title, artist)
+        if found is not None:
+            found = dict(found, title=title, artist=artist, fetched_at=int(time.time()))
+            _save_json(path, found)
+        result = (found, error)
+    finally:
+        with lyrics_lock:
+            lyrics_inflight.pop(path, None)
+        future.set_result(result)
+    return result + (False,)
+
+
+def _prefetch_lyrics(item):
+    title = item.get("title")
+    if not title or not _get_online_mode():
+        return
+    artist = item.get("artist") or ""
+    path = _lyrics_cache_path(title, artist)
+    with lyrics_lock:
+        if path in lyrics_inflight:
+            return
+    data = _load_json(path, None)
+    if data and _lyrics_is_fresh(data):
+        return
+    lyrics_prefetch_executor.submit(_get_lyrics, title, artist)
+
+
+def _merge_history(history, item, played_at=None):
     item = dict(item)
-    item["played_at"] = int(time.time())
+    item["played_at"] = int(played_at or time.time())
+    previous = next((h for h in history if h.get("id") == item.get("id")), None)
+    if previous and previous.get("played_at", 0) > item["played_at"]:
+        return history
     history = [h for h in history if h.get("id") != item.get("id")]
-    history.insert(0, item)
-    history = history[:100]
-    _save_json(HISTORY_JSON, history)
+    history.append(item)
+    history.sort(key=lambda h: h.get("played_at", 0), reverse=True)
+    return history[:HISTORY_MAX_ITEMS]
+
+
+def _add_history(item):
+    with history_lock:
+        history = _load_json(HISTORY_JSON, [])
+        history = _merge_history(history, item)
+        _save_json(HISTORY_JSON, history)
+    _radio_on_play(item)
+
+
+def _apply_playlist_op(playlists, op):
+    action = (op.get("op") or "").lower()
+    name = op.get("name")
+    if not name:
+        return "missing name"
+    target = next((p for p in playlists if p.get("name") == name), None)
+
+    if action == "create":
+        if target is not None:
+            return "exists"
+        playlists.append({"name": name, "items": []})
+        return None
+    if target is None:
+        return "playlist not found"
+
+    items = target.setdefault("items", [])
+    if action == "add":
+        item = op.get("item")
+        if not isinstance(item, dict):
+            return "missing item"
+        target["items"] = [i for i in items if i.get("id") != item.get("id")]
+        target["items"].append(item)
+        return None
+    if action == "remove":
+        item_id = op.get("id")
+        if not item_id:
+            return "missing id"
+        target["items"] = [i for i in items if i.get("id") != item_id]
+        return None if len(target["items"]) != len(items) else "not found"
+    if action == "move":
+        item_id = op.get("id")
+        index = next((n for n, i in enumerate(items) if i.get("id") == item_id), None)
+        if index is None:
+            return "not found"
+        try:
+            to = int(op.get("to"))
+        except (TypeError, ValueError):
+            return "missing to"
+        moved = items.pop(index)
+        items.insert(max(0, min(len(items), to)), moved)
+        return None
+    return "unknown op"
 
 
 def _add_download_entry(entry):
-    downloads = _load_json(DOWNLOADS_JSON, [])
-    downloads = [d for d in downloads if d.get("id") != entry.get("id")]
-    downloads.append(entry)
-    _save_json(DOWNLOADS_JSON, downloads)
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+        downloads = [d for d in downloads if d.get("id") != entry.get("id")]
+        downloads.append(entry)
+        _save_json(DOWNLOADS_JSON, downloads)
+
+
+def _is_downloaded(key):
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+    for item in downloads:
+        if item.get("id") == key and _file_stat(item.get("path") or _download_path(item.get("title") or "")):
+            return True
+    return False
+
+
+def _reserve_download_path(title, key):
+    # Deux titres homonymes (clés différentes) ne doivent pas écrire le même fichier.
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+        owners = {}
+        for d in downloads:
+            owners[d.get("path") or _download_path(d.get("title") or "")] = d.get("id")
+            if d.get("id") == key and d.get("path") and download_paths_reserved.get(d["path"]) in (None, key):
+                download_paths_reserved[d["path"]] = key
+                return d["path"]
+        base = _safe_title(title)
+        n = 1
+        while True:
+            path = os.path.join(MUSIC_DIR, f"{base}.mp3" if n == 1 else f"{base}-{n}.mp3")
+            if (download_paths_reserved.get(path) or owners.get(path)) in (None, key):
+                download_paths_reserved[path] = key
+                return path
+            n += 1
+
+
+def _release_download_path(path, key):
+    with downloads_lock:
+        if download_paths_reserved.get(path) == key:
+            download_paths_reserved.pop(path)
+
+
+def _download_track(url, title, artist, cover_url):
+    key = _cache_key(url, title)
+    path = _reserve_download_path(title, key)
+    try:
+        return _download_to_library(url, title, artist, cover_url, key, path)
+    finally:
+        _release_download_path(path, key)
+
+
+def _download_to_library(url, title, artist, cover_url, key, path):
+    # Passe par le cache (dédupliqué avec lecture/prefetch) puis lien dur vers la bibliothèque.
+    if not _promote_cached_track(key, path):
+        with download_slots:
+            _, error = _fill_cache(url, title, artist, cover_url)
+        if error:
+            return None, error
+        if not _promote_cached_track(key, path):
+            return None, "download failed"
+
+    if cover_url and not _file_stat(_cover_path(key)):
+        _save_cover_from_url(cover_url, key)
+    entry = {
+        "id": key,
+        "title": title,
+        "artist": artist,
+        "url": url,
+        "path": path,
+        "cover_path": _cover_path(key) if _file_stat(_cover_path(key)) else None,
+        "downloaded": True,
+        "downloaded_at": int(time.time()),
+    }
+    _add_download_entry(entry)
+    _touch_cache_entry(key, dict(entry, last_played=time.time()))
+    return entry, None
+
+
+def _save_download_jobs():
+    with download_jobs_lock:
+        _save_json(DOWNLOAD_JOBS_JSON, list(download_jobs.values()))
+
+
+def _prune_download_jobs():
+    # Jobs terminés (ou en erreur) gardés DOWNLOAD_JOBS_TTL pour le suivi, puis oubliés.
+    now = time.time()
+    with download_jobs_lock:
+        stale = [
+            job_id for job_id, job in download_jobs.items()
+            if job.get("status") != "running"
+            and now - (job.get("finished_at") or job.get("created_at") or 0) > DOWNLOAD_JOBS_TTL
+        ]
+        for job_id in stale:
+            download_jobs.pop(job_id)
+    return bool(stale)
+
+
+def _download_job_summary(job):
+    states = [it.get("state") for it in job.get("items") or []]
+    return {
+        "id": job["id"],
+        "source": job.get("source"),
+        "status": job.get("status"),
+        "error": job.get("error"),
+        "total": len(states) if job.get("items") is not None else None,
+        "done": states.count("done"),
+        "skipped": states.count("skipped"),
+        "failed": states.count("failed"),
+        "pending": sum(1 for st in states if st not in {"done", "skipped", "failed"}),
+        "created_at": job.get("created_at"),
+    }
+
+
+def _bulk_download_one(job, index):
+    item = job["items"][index]
+    url = item.get("url")
+    title = item.get("title") or "Track"
+    key = _cache_key(url, title)
+    if _is_downloaded(key):
+        state, error = "skipped", None
+    else:
+        cover_url = item.get("cover") or _yt_cover_url(_yt_video_id(url))
+        _, error = _download_track(url, title, item.get("artist") or "", cover_url)
+        state = "failed" if error else "done"
+    with download_jobs_lock:
+        item["state"] = state
+        item["error"] = error
+    _save_download_jobs()
+
+
+def _run_download_job(job_id):
+    with download_jobs_lock:
+        job = download_jobs.get(job_id)
+    if job is None:
+        return
+
+    if job.get("items") is None:
+        source = job.get("source") or {}
+        if source.get("playlist"):
+            playlists = _load_json(PLAYLIST_JSON, [])
+            target = next((p for p in playlists if p.get("name") == source["playlist"]), None)
+            items = list(target.get("items") or []) if target else None
+            error = None if target else "playlist not found"
+        else:
+            items, error = _resolve_playlist_tracks(source.get("id") or "", limit=None)
+        if items is None:
+            with download_jobs_lock:
+                job["status"] = "error"
+                job["error"] = error or "resolve failed"
+                job["finished_at"] = int(time.time())
+            _save_download_jobs()
+            return
+        with download_jobs_lock:
+            job["items"] = [
+                {
+                    "url": it.get("url"),
+                    "title": it.get("title"),
+                    "artist": it.get("artist") or "",
+                    "cover": it.get("cover"),
+                    "state": "pending",
+                }
+                for it in items
+                if it.get("url") and (it.get("type") or "track") == "track"
+            ]
+        _save_download_jobs()
+
+    pending = [i for i, it in enumerate(job["items"]) if it.get("state") not in {"done", "skipped"}]
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as executor:
+        list(executor.map(lambda index: _bulk_download_one(job, index), pending))
+
+    with download_jobs_lock:
+        job["status"] = "done"
+        job["finished_at"] = int(time.time())
+    _save_download_jobs()
+
+
+def _start_download_job(source):
+    job_id = uuid.uuid4().hex[:12]
+    with download_jobs_lock:
+        download_jobs[job_id] = {
+            "id": job_id,
+            "source": source,
+            "status": "running",
+            "error": None,
+            "items": None,
+            "created_at": int(time.time()),
+        }
+    _prune_download_jobs()
+    _save_download_jobs()
+    threading.Thread(target=_run_download_job, args=(job_id,), daemon=True).start()
+    return job_id
+
+
+def _resume_download_jobs():
+    jobs = _load_json(DOWNLOAD_JOBS_JSON, [])
+    with download_jobs_lock:
+        for job in jobs:
+            if job.get("id"):
+                download_jobs[job["id"]] = job
+    if _prune_download_jobs():
+        _save_download_jobs()
+    for job in jobs:
+        if job.get("status") == "running":
+            threading.Thread(target=_run_download_job, args=(job["id"],), daemon=True).start()
+
+
+class _PrefetchCancelled(Exception):
+    pass
+
+
+class _PrefetchScheduler:
+    """Précharge la file de lecture du client, au plus près de la position courante d'abord."""
+
+    def __init__(self, ahead, concurrency, bandwidth):
+        self.ahead = ahead
+        self.concurrency = concurrency
+        self.bandwidth = bandwidth
+        self.cond = threading.Condition()
+        self.clients = OrderedDict()
+        self.window = []
+        self.window_keys = set()
+        self.active = set()
+        self.failed = {}
+        self.preempted = {}
+        self.workers = []
+
+    def update(self, items, position, client=None):
+        window = []
+        seen = set()
+        # Le titre courant est exclu : sa lecture passe par le chemin interactif, pas par le prefetch.
+        for index in range(max(0, position + 1), min(len(items), position + 1 + self.ahead)):
+            item = items[index] or {}
+            url = item.get("url")
+            if not url or item.get("file_url"):
+                continue
+            key = _cache_key(url, item.get("title") or "Track")
+            if key in seen:
+                continue
+            seen.add(key)
+            window.append((index - position, key, item))
+        with self.cond:
+            self.clients[client] = (time.time(), window)
+            self.clients.move_to_end(client)
+            self._merge_windows()
+            self.cond.notify_all()
+        self._ensure_workers()
+        # Les lyrics sont légers : prêts avant le début du titre, même déjà téléchargé.
+        for index in range(max(0, position), min(len(items), position + 1 + self.ahead)):
+            _prefetch_lyrics(items[index] or {})
+        return self.status(client)
+
+    def _merge_windows(self):
+        now = time.time()
+        for client, (updated, _) in list(self.clients.items()):
+            if now - updated > PREFETCH_CLIENT_TTL or len(self.clients) > PREFETCH_CLIENTS_MAX:
+                self.clients.pop(client, None)
+        # Chaque titre garde sa plus petite distance, tous clients confondus.
+        merged = {}
+        for _, window in self.clients.values():
+            for distance, key, item in window:
+                if key not in merged or distance < merged[key][0]:
+                    merged[key] = (distance, key, item)
+        self.window = sorted(merged.values(), key=lambda job: job[0])
+        self.window_keys = set(merged)
+
+    def preempt(self, key):
+        # Lecture interactive : le prefetch en cours de ce titre s'arrête et lui laisse la place.
+        with self.cond:
+            now = time.time()
+            for stale in [k for k, at in self.preempted.items() if now - at > PREFETCH_RETRY_SECONDS]:
+                self.preempted.pop(stale, None)
+            self.preempted[key] = now
+
+    def status(self, client=None):
+        with self.cond:
+            if client in self.clients:
+                window = list(self.clients[client][1])
+            else:
+                window = list(self.window)
+            active = set(self.active)
+            failed = dict(self.failed)
+        items = []
+        for distance, key, item in window:
+            if _local_track_path(key):
+                state = "ready"
+            elif PREFETCH_MODE == "head" and key not in active and _head_prefix(key):
+                state = "head"
+            elif key in active:
+                state = "fetching"
+            elif key in failed:
+                state = "failed"
+            else:
+                state = "pending"
+            items.append({"key": key, "url": item.get("url"), "distance": distance, "state": state})
+        return items
+
+    def _is_preempted(self, key):
+        at = self.preempted.get(key)
+        return at is not None and time.time() - at < PREFETCH_RETRY_SECONDS
+
+    def _is_stale(self, key):
+        with self.cond:
+            return key not in self.window_keys or self._is_preempted(key)
+
+    def _next_job(self):
+        now = time.time()
+        for distance, key, item in self.window:
+            if key in self.active or self._is_preempted(key):
+                continue
+            if now - self.failed.get(key, 0) < PREFETCH_RETRY_SECONDS:
+                continue
+            if _local_track_path(key):
+                continue
+            if PREFETCH_MODE == "head" and _head_prefix(key):
+                continue
+            return key, item
+        return None, None
+
+    def _ensure_workers(self):
+        with self.cond:
+            self.workers = [w for w in self.workers if w.is_alive()]
+            while len(self.workers) < self.concurrency:
+                worker = threading.Thread(target=self._run, daemon=True)
+                self.workers.append(worker)
+                worker.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                key, item = self._next_job()
+                while key is None or not _get_online_mode():
+                    self.cond.wait(timeout=30)
+                    key, item = self._next_job()
+                self.active.add(key)
+                share = len(self.active)
+            self._fetch(key, item, share)
+
+    def _fetch(self, key, item, share):
+        def _hook(progress):
+            if self._is_stale(key):
+                raise _PrefetchCancelled(key)
+
+        extra_opts = {"progress_hooks": [_hook]}
+        if self.bandwidth > 0:
+            extra_opts["ratelimit"] = max(1, self.bandwidth // share)
+
+        url = item.get("url")
+        cover_url = item.get("cover") or _yt_cover_url(_yt_video_id(url))
+        if _is_bad_thumb(cover_url):
+            cover_url = None
+        error = None
+        try:
+            if PREFETCH_MODE == "head":
+                error = _prefetch_head(key, item, lambda: self._is_stale(key), extra_opts.get("ratelimit", 0))
+            else:
+                _, error = _fill_cache(url, item.get("title") or "Track", item.get("artist") or "", cover_url, extra_opts=extra_opts)
+        except Exception as e:
+            error = str(e)
+        with self.cond:
+            self.active.discard(key)
+            if error and key in self.window_keys:
+                self.failed[key] = time.time()
+            else:
+                self.failed.pop(key, None)
+            self.cond.notify_all()
+        if not error:
+            _cleanup_cache()
+
+
+prefetch_scheduler = _PrefetchScheduler(PREFETCH_AHEAD, PREFETCH_CONCURRENCY, PREFETCH_BANDWIDTH)
+
+
+def _media_etag(tag, size, mtime=None):
+    # mtime comme l'ETag par défaut de Werkzeug : un fichier remplacé à taille égale change d'ETag.
+    return hashlib.sha256(f"{tag}:{size}:{mtime}".encode("utf-8")).hexdigest()[:32]
+
+
+def _send_media(path, tag, max_age=None, immutable=False):
+    stat = _file_stat(path)
+    if not stat:
+        return jsonify({"ok": False, "error": "not found"}), 404
+    etag = _media_etag(tag, stat[0], stat[1])
+
+    if SENDFILE_MODE in {"x-accel", "x-sendfile"}:
+        resp = Response(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+        resp.headers.pop("Content-Length", None)
+        resp.automatically_set_content_length = False
+        if SENDFILE_MODE == "x-accel":
+            rel = os.path.relpath(path, DATA_DIR).replace(os.sep, "/")
+            resp.headers["X-Accel-Redirect"] = f"{ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(rel)}"
+        else:
+            resp.headers["X-Sendfile"] = path
+        resp.headers["Accept-Ranges"] = "bytes"
+        resp.set_etag(etag)
+        if max_age:
+            resp.cache_control.public = True
+            resp.cache_control.max_age = max_age
+        else:
+            resp.cache_control.no_cache = True
+        # Le proxy gère les Range, on ne répond ici qu'aux revalidations (304).
+        resp = resp.make_conditional(request)
+    else:
+        try:
+            resp = send_file(path, as_attachment=False, etag=etag, max_age=max_age, conditional=True)
+        except OSError:
+            # Fichier supprimé hors de l'application : l'index se corrige.
+            _file_index_update(path)
+            return jsonify({"ok": False, "error": "not found"}), 404
+
+    if immutable and max_age:
+        resp.cache_control.immutable = True
+    return resp
+
+
+def _should_profile():
+    global profiling_active
+    with profiling_lock:
+        until = profiling["until"]
+        if until and time.time() > until:
+            profiling.update(rate=0.0, endpoint=None, until=None)
+            profiling_active = False
+            return False
+        endpoint = profiling["endpoint"]
+        rate = profiling["rate"]
+    if endpoint:
+        return request.endpoint == endpoint
+    return random.random() < rate
+
+
+@app.before_request
+def _start_profile():
+    # Désactivé : un seul test de booléen par requête.
+    if not profiling_active or request.endpoint in {"api_admin_profiling", "api_admin_profile"}:
+        return
+    if not _should_profile():
+        return
+    # Un profil à la fois : cProfile ne supporte pas deux profileurs actifs (3.12+).
+    if not profile_slot.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    g.profile = {"profiler": profiler, "started": time.time(), "status": None}
+    profiler.enable()
+
+
+@app.after_request
+def _note_profile_status(response):
+    if "profile" in g:
+        g.profile["status"] = response.status_code
+    return response
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    state = g.pop("profile", None)
+    if state is None:
+        return
+    state["profiler"].disable()
+    try:
+        stats = pstats.Stats(state["profiler"])
+        recent_profiles.append(
+            {
+                "id": uuid.uuid4().hex[:12],
+                "endpoint": request.endpoint,
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "status": state["status"] or 500,
+                "started_at": state["started"],
+                "duration_ms": round((time.time() - state["started"]) * 1000, 2),
+                "total_tt": stats.total_tt,
+                "stats": stats.stats,
+            }
+        )
+    finally:
+        profile_slot.release()
+
+
+def _profile_label(func):
+    filename, line, name = func
+    if filename == "~":
+        label = name
+    else:
+        if filename.startswith(BASE_DIR):
+            filename = os.path.relpath(filename, BASE_DIR)
+        else:
+            filename = "/".join(filename.replace(os.sep, "/").split("/")[-2:])
+        label = f"{filename}:{name}:{line}"
+    return label.replace(";", ",").replace(" ", "_")
+
+
+def _collapsed_stacks(stats):
+    # Format "pile;de;fonctions microsecondes" (flamegraph.pl, speedscope), reconstruit
+    # depuis le graphe d'appels de cProfile en répartissant le temps au prorata des arêtes.
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    lines = {}
+
+    def _walk(func, stack, on_stack, weight):
+        _, _, tt, ct, _ = stats[func]
+        if ct <= 0 or weight * 1e6 < PROFILE_MIN_US:
+            return
+        scale = min(1.0, weight / ct)
+        stack = stack + [_profile_label(func)]
+        key = ";".join(stack)
+        if len(stack) >= PROFILE_MAX_DEPTH:
+            lines[key] = lines.get(key, 0.0) + weight
+            return
+        lines[key] = lines.get(key, 0.0) + tt * scale
+        on_stack.add(func)
+        for child, edge_ct in callees.get(func, ()):
+            if child not in on_stack:
+                _walk(child, stack, on_stack, edge_ct * scale)
+        on_stack.discard(func)
+
+    for func, (_, _, _, ct, callers) in stats.items():
+        if not callers:
+            _walk(func, [], set(), ct)
+    return "\n".join(f"{key} {int(value * 1e6)}" for key, value in sorted(lines.items()) if int(value * 1e6) > 0)
+
+
+def _admin_allowed():
+    if ADMIN_TOKEN:
+        return (request.headers.get("X-Admin-Token") or request.args.get("token")) == ADMIN_TOKEN
+    # Sans jeton configuré : uniquement depuis la machine elle-même.
+    return request.remote_addr in {"127.0.0.1", "::1"}
+
+
+@app.after_request
+def _compress_json_response(response):
+    if response.mimetype != "application/json" or response.direct_passthrough:
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == "br":
+        body = brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+    else:
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
 
 
 @app.route("/")
@@ -829,9 +3605,68 @@ def index():
     return render_template("index.html", app_name=APP_NAME)
 
 
+@app.route("/api/admin/profiling", methods=["GET", "POST"])
+def api_admin_profiling():
+    global profiling_active
+    if not _admin_allowed():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    if request.method == "POST":
+        payload = request.get_json(silent=True) or {}
+        try:
+            rate = float(payload.get("rate") or 0)
+            duration = float(payload.get("duration") or 0)
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error": "invalid rate/duration"}), 400
+        if not math.isfinite(rate) or not math.isfinite(duration):
+            # nan passerait le bornage (max/min) et inf n'a pas de forme JSON valide.
+            return jsonify({"ok": False, "error": "invalid rate/duration"}), 400
+        rate = max(0.0, min(1.0, rate))
+        endpoint = payload.get("endpoint") or None
+        if endpoint and endpoint not in app.view_functions:
+            return jsonify({"ok": False, "error": "unknown endpoint"}), 400
+        with profiling_lock:
+            profiling.update(rate=rate, endpoint=endpoint, until=time.time() + duration if duration > 0 else None)
+            profiling_active = bool(rate or endpoint)
+        if payload.get("clear"):
+            recent_profiles.clear()
+    with profiling_lock:
+        config = dict(profiling, active=profiling_active)
+    items = [{k: v for k, v in p.items() if k != "stats"} for p in list(recent_profiles)]
+    return jsonify({"ok": True, "config": config, "items": items[::-1]})
+
+
+@app.route("/api/admin/profiling/<profile_id>")
+def api_admin_profile(profile_id):
+    if not _admin_allowed():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    profile = next((p for p in list(recent_profiles) if p["id"] == profile_id), None)
+    if profile is None:
+        return jsonify({"ok": False, "error": "not found"}), 404
+    fmt = (request.args.get("format") or "collapsed").lower()
+    if fmt == "collapsed":
+        return Response(_collapsed_stacks(profile["stats"]), mimetype="text/plain")
+    if fmt == "pstats":
+        try:
+            limit = int(request.args.get("limit") or 40)
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid limit"}), 400
+        sort = request.args.get("sort") or "cumulative"
+        # Clés acceptées par sort_stats (valeurs de pstats.SortKey et leurs abréviations).
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            return jsonify({"ok": False, "error": "invalid sort"}), 400
+        out = StringIO()
+        stats = pstats.Stats(stream=out)
+        stats.stats = profile["stats"]
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return Response(out.getvalue(), mimetype="text/plain")
+    return jsonify({"ok": False, "error": "format must be collapsed or pstats"}), 400
+
+
 @app.route("/api/status")
 def api_status():
-    return jsonify({"ok": True, "online": _get_online_mode()})
+    upstreams = {name: health.snapshot() for name, health in upstream_health.items()}
+    return jsonify({"ok": True, "online": _get_online_mode(), "upstreams": upstreams})
 
 
 @app.route("/api/online", methods=["POST"])
@@ -850,7 +3685,17 @@ def api_search():
     if not q:
         return jsonify({"ok": False, "error": "missing q"}), 400
     include_types = _parse_types_filter(request.args.get("types"), default_types={"track", "artist"})
-    entries, error = _yt_dlp_search(q, limit=12)
+    # Sans identifiant explicite, plusieurs clients derrière la même IP ne s'annulent pas entre eux.
+    client_id = request.args.get("client")
+    is_current = _begin_search(client_id) if client_id else None
+    if is_current is not None and request.args.get("live") == "1":
+        # Frappe en cours uniquement : une recherche validée (Entrée) part tout de suite.
+        time.sleep(SEARCH_DEBOUNCE_SECONDS)
+        if not is_current():
+            return jsonify({"ok": False, "error": "superseded"}), 409
+    entries, error = _yt_dlp_search(q, limit=12, is_current=is_current)
+    if error == "superseded":
+        return jsonify({"ok": False, "error": error}), 409
     if entries is None:
         return jsonify({"ok": False, "error": error or "search failed"}), 500
     items = []
@@ -869,11 +3714,21 @@ def api_search():
     return jsonify({"ok": True, "items": items})
 
 
-@app.route("/api/search/expand")
-def api_search_expand():
+@app.route("/api/search/suggest")
+def api_search_suggest():
     if not _get_online_mode():
         return jsonify({"ok": False, "error": "offline"}), 400
+    q = request.args.get("q") or ""
+    if not q.strip():
+        return jsonify({"ok": True, "items": []})
+    items, error = _get_search_suggestions(q)
+    if items is None:
+        return jsonify({"ok": False, "error": error or "suggest failed"}), 500
+    return jsonify({"ok": True, "items": items})
+
 
+@app.route("/api/search/expand")
+def api_search_expand():
     entry_type = (request.args.get("type") or "").strip().lower()
     entry_id = (request.args.get("id") or "").strip()
     title = (request.args.get("title") or "").strip()
@@ -882,35 +3737,200 @@ def api_search_expand():
     if not entry_id:
         return jsonify({"ok": False, "error": "missing id"}), 400
 
-    if entry_type == "artist":
-        items, error = _resolve_artist_tracks(entry_id, fallback_title=title, limit=12)
-    else:
-        items, error = _resolve_playlist_tracks(entry_id, limit=12)
-
+    online = _get_online_mode()
+    items, error, state = _get_expanded_tracks(entry_type, entry_id, title, online=online)
     if items is None:
+        if not online:
+            return jsonify({"ok": False, "error": "offline"}), 400
         return jsonify({"ok": False, "error": error or "expand failed"}), 500
-    return jsonify({"ok": True, "items": items})
+    return jsonify({"ok": True, "items": items, "cache": state})
 
 
-@app.route("/api/cache/play", methods=["POST"])
-def api_cache_play():
-    payload = request.get_json(silent=True) or {}
+def _stream_expiry(stream_url):
+    # URL signée googlevideo : "expire" en query (ou segment /expire/<ts>/ pour les manifestes).
+    parsed = urlparse(stream_url)
+    value = (parse_qs(parsed.query).get("expire") or [None])[0]
+    if value is None:
+        match = re.search(r"/expire/(\d+)", parsed.path)
+        value = match.group(1) if match else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return int(time.time()) + STREAM_URL_DEFAULT_TTL
+
+
+def _resolve_stream(key, url, title, artist, cover_url):
+    with stream_lock:
+        entry = stream_urls.get(key)
+        if entry and entry["expires"] - STREAM_URL_MARGIN > time.time():
+            return entry, None
+        future = stream_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            stream_inflight[key] = future
+    if not owner:
+        # Extraction partagée, mais pas d'attente sans fin si elle reste bloquée.
+        try:
+            return future.result(timeout=upstream_health["ytdlp"].timeout())
+        except FuturesTimeoutError:
+            return None, "timeout"
+
+    result = (None, "stream resolution failed")
+    try:
+        info, error = _yt_dlp_info(url, extra_opts={"format": "bestaudio/best"})
+        if not info or not info.get("url"):
+            result = (None, error or "no stream url")
+        else:
+            entry = {
+                "key": key,
+                "url": url,
+                "title": title,
+                "artist": artist,
+                "cover": cover_url,
+                "stream_url": info["url"],
+                "headers": dict(info.get("http_headers") or {}),
+                "mimetype": STREAM_MIMETYPES.get(info.get("ext"), "application/octet-stream"),
+                "ext": info.get("ext"),
+                "format_id": info.get("format_id"),
+                "filesize": info.get("filesize"),
+                "bitrate": info.get("abr") or info.get("tbr"),
+                "duration": info.get("duration"),
+                "expires": _stream_expiry(info["url"]),
+            }
+            now = time.time()
+            with stream_lock:
+                for stale in [k for k, e in stream_urls.items() if e["expires"] <= now]:
+                    stream_urls.pop(stale, None)
+                stream_urls[key] = entry
+            result = (entry, None)
+    finally:
+        with stream_lock:
+            stream_inflight.pop(key, None)
+        future.set_result(result)
+    return result
+
+
+def _invalidate_stream(key, stream_url):
+    with stream_lock:
+        entry = stream_urls.get(key)
+        if entry and entry["stream_url"] == stream_url:
+            # Signature refusée avant l'échéance annoncée : on force une nouvelle extraction.
+            entry["expires"] = 0
+
+
+def _serve_head(entry, head):
+    # Début déjà sur disque : réponse immédiate, le navigateur demande la suite par Range.
+    match = re.fullmatch(r"bytes=(\d+)-(\d*)", (request.headers.get("Range") or "").strip())
+    total = entry.get("filesize") or head.get("total_bytes")
+    if not match or not total or head.get("format_id") != entry.get("format_id"):
+        return None
+    start = int(match.group(1))
+    if start >= head["head_bytes"]:
+        return None
+    stop = min(int(match.group(2)) if match.group(2) else total - 1, head["head_bytes"] - 1)
+    try:
+        with open(head["head_path"], "rb") as f:
+            f.seek(start)
+            data = f.read(stop - start + 1)
+    except OSError:
+        return None
+    if len(data) != stop - start + 1:
+        return None
+    resp = Response(data, status=206, mimetype=entry["mimetype"])
+    resp.headers["Content-Range"] = f"bytes {start}-{stop}/{total}"
+    resp.headers["Accept-Ranges"] = "bytes"
+    resp.cache_control.no_store = True
+    return resp
+
+
+def _stream_source(key, payload):
+    # Entrée perdue (redémarrage) : le client renvoie l'URL du titre, vérifiée contre la clé.
     url = payload.get("url")
     title = payload.get("title") or "Track"
-    artist = payload.get("artist") or ""
-    cover_url = payload.get("cover")
-    if not cover_url:
-        cover_url = _yt_cover_url(_yt_video_id(url))
-    if _is_bad_thumb(cover_url):
-        cover_url = None
-    if not url:
-        return jsonify({"ok": False, "error": "missing url"}), 400
+    if not url or _cache_key(url, title) != key:
+        return None
+    return {"url": url, "title": title, "artist": payload.get("artist") or "", "cover": payload.get("cover")}
+
+
+def _proxy_stream(key):
+    with stream_lock:
+        entry = stream_urls.get(key)
+    if entry is None:
+        source = _stream_source(key, request.args)
+        if source is None:
+            return jsonify({"ok": False, "error": "not found"}), 404
+        entry, error = _resolve_stream(key, source["url"], source["title"], source["artist"], source["cover"])
+        if error:
+            return jsonify({"ok": False, "error": error}), 502
+    head = _head_prefix(key)
+    if head:
+        resp = _serve_head(entry, head)
+        if resp is not None:
+            return resp
+    import requests
+
+    upstream = None
+    for _ in range(2):
+        entry, error = _resolve_stream(key, entry["url"], entry["title"], entry["artist"], entry["cover"])
+        if error:
+            return jsonify({"ok": False, "error": error}), 502
+        headers = dict(entry["headers"])
+        if request.headers.get("Range"):
+            headers["Range"] = request.headers["Range"]
+        try:
+            upstream = requests.get(entry["stream_url"], headers=headers, stream=True, timeout=(5, 30))
+        except Exception as e:
+            return jsonify({"ok": False, "error": str(e)}), 502
+        if upstream.status_code != 403:
+            break
+        upstream.close()
+        _invalidate_stream(key, entry["stream_url"])
+    if upstream.status_code == 416:
+        upstream.close()
+        return Response(status=416, headers={"Content-Range": upstream.headers.get("Content-Range", "")})
+    if upstream.status_code not in {200, 206}:
+        upstream.close()
+        return jsonify({"ok": False, "error": f"upstream {upstream.status_code}"}), 502
+
+    def _body():
+        try:
+            for chunk in upstream.iter_content(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            upstream.close()
+
+    resp = Response(_body(), status=upstream.status_code, mimetype=entry["mimetype"], direct_passthrough=True)
+    for name in ("Content-Length", "Content-Range"):
+        if upstream.headers.get(name):
+            resp.headers[name] = upstream.headers[name]
+    resp.headers["Accept-Ranges"] = "bytes"
+    # L'URL signée expire : rien à garder côté navigateur.
+    resp.cache_control.no_store = True
+    return resp
+
+
+def _promote_stream(key, source=None):
+    with stream_lock:
+        entry = stream_urls.get(key) or source
+    if entry is None or _local_track_path(key):
+        return
+    _, error = _fill_cache(entry["url"], entry["title"], entry["artist"], entry["cover"])
+    if not error:
+        _cleanup_cache()
 
-    key = _cache_key(url, title)
-    path = _cache_path(key)
-    cover_path = _cover_path(key)
 
-    if os.path.exists(path):
+def _after_cache_hit(key, url, title, artist, cover_url):
+    # Hors du chemin critique : mise à jour de l'entrée et validation de la pochette.
+    cover_path = _cover_path(key)
+    if not _file_stat(cover_path) and _get_online_mode():
+        if not cover_url:
+            cover_url = _yt_cover_url(_yt_video_id(url))
+        if cover_url and not _is_bad_thumb(cover_url):
+            _save_cover_from_url(cover_url, key)
+    # Lecture et écriture sous le même verrou : une modification concurrente n'est pas écrasée.
+    with cache_db_lock:
+        existing = _load_json(CACHE_JSON, {}).get(key) or {}
         _touch_cache_entry(
             key,
             {
@@ -918,83 +3938,134 @@ def api_cache_play():
                 "title": title,
                 "artist": artist,
                 "url": url,
-                "path": path,
-                "cover_path": cover_path if os.path.exists(cover_path) else None,
+                "path": _local_track_path(key, existing) or existing.get("path") or _cache_path(key),
+                "cover_path": cover_path if _file_stat(cover_path) else None,
                 "last_played": time.time(),
-                "downloaded": False,
             },
         )
-        return jsonify({"ok": True, "file_url": f"/api/cache/file?key={quote(key)}", "key": key})
+
+
+@app.route("/api/cache/play", methods=["POST"])
+def api_cache_play():
+    payload = request.get_json(silent=True) or {}
+    url = payload.get("url")
+    title = payload.get("title") or "Track"
+    artist = payload.get("artist") or ""
+    cover_url = payload.get("cover")
+    if not url:
+        return jsonify({"ok": False, "error": "missing url"}), 400
+
+    # Cache hit : aucune E/S réseau, la suite se fait en arrière-plan.
+    key = _cache_key(url, title)
+    if _local_track_path(key):
+        background_executor.submit(_after_cache_hit, key, url, title, artist, cover_url)
+        return jsonify({"ok": True, "file_url": f"/api/cache/file?key={quote(key)}", "key": key, "cached": True})
 
     if not _get_online_mode():
         return jsonify({"ok": False, "error": "offline and not cached"}), 400
 
-    info, error = _yt_dlp_info(url, download=True, outtmpl=os.path.join(CACHE_MUSIC_DIR, f"{key}.%(ext)s"))
-    if not info:
-        return jsonify({"ok": False, "error": error or "download failed"}), 500
+    prefetch_scheduler.preempt(key)
+    if not cover_url:
+        cover_url = _yt_cover_url(_yt_video_id(url))
+    if _is_bad_thumb(cover_url):
+        cover_url = None
+    head = _head_prefix(key)
+    if head or (payload.get("mode") or PLAY_MODE) == "stream":
+        # Une seule extraction avant la lecture ; le fichier complet viendra après le seuil.
+        # Avec un début préchargé, la suite est demandée dès que la lecture démarre.
+        entry, error = _resolve_stream(key, url, title, artist, cover_url)
+        if error:
+            return jsonify({"ok": False, "error": error}), 500
+        return jsonify(
+            {
+                "ok": True,
+                # url/title : de quoi refaire l'extraction si le serveur a redémarré entre-temps.
+                "file_url": f"/api/cache/file?key={quote(key)}&stream=1&url={quote(url, safe='')}&title={quote(title, safe='')}",
+                "key": key,
+                "cached": False,
+                "stream": True,
+                "promote_after": 0 if head else STREAM_PROMOTE_SECONDS,
+            }
+        )
+    key, error = _fill_cache(url, title, artist, cover_url, interactive=True)
+    if error:
+        return jsonify({"ok": False, "error": error}), 500
+    _cleanup_cache()
+    return jsonify({"ok": True, "file_url": f"/api/cache/file?key={quote(key)}", "key": key, "cached": False})
 
-    if cover_url:
-        _save_cover_from_url(cover_url, key)
 
-    _touch_cache_entry(
-        key,
-        {
-            "id": key,
-            "title": title,
-            "artist": artist,
-            "url": url,
-            "path": path,
-            "cover_path": cover_path if os.path.exists(cover_path) else None,
-            "last_played": time.time(),
-            "downloaded": False,
-        },
-    )
-    _cleanup_cache()
-    return jsonify({"ok": True, "file_url": f"/api/cache/file?key={quote(key)}", "key": key})
+@app.route("/api/cache/promote", methods=["POST"])
+def api_cache_promote():
+    payload = request.get_json(silent=True) or {}
+    key = payload.get("key") or ""
+    with stream_lock:
+        known = key in stream_urls
+    source = None if known else _stream_source(key, payload)
+    if not known and source is None:
+        return jsonify({"ok": False, "error": "not found"}), 404
+    background_executor.submit(_promote_stream, key, source)
+    return jsonify({"ok": True})
 
 
 @app.route("/api/cache/prefetch", methods=["POST"])
 def api_cache_prefetch():
-    if not _get_online_mode():
-        return jsonify({"ok": False, "error": "offline"}), 400
     payload = request.get_json(silent=True) or {}
-    items = payload.get("items") or []
-    def _prefetch():
-        for item in items[:3]:
-            url = item.get("url")
-            title = item.get("title") or "Track"
-            artist = item.get("artist") or ""
-            cover_url = item.get("cover")
-            if not cover_url:
-                cover_url = _yt_cover_url(_yt_video_id(url))
-            if _is_bad_thumb(cover_url):
-                cover_url = None
-            if not url:
-                continue
-            key = _cache_key(url, title)
-            path = _cache_path(key)
-            if os.path.exists(path):
-                continue
-            _yt_dlp_info(url, download=True, outtmpl=os.path.join(CACHE_MUSIC_DIR, f"{key}.%(ext)s"))
-            if cover_url:
-                _save_cover_from_url(cover_url, key)
-            _touch_cache_entry(
-                key,
-                {
-                    "id": key,
-                    "title": title,
-                    "artist": artist,
-                    "url": url,
-                    "path": path,
-                    "cover_path": _cover_path(key) if os.path.exists(_cover_path(key)) else None,
-                    "last_played": time.time(),
-                    "downloaded": False,
-                },
-            )
-        _cleanup_cache()
+    if "queue" in payload:
+        items = payload.get("queue") or []
+        try:
+            position = int(payload.get("index", -1))
+        except (TypeError, ValueError):
+            position = -1
+    else:
+        # Ancien format : uniquement les prochains titres.
+        items = payload.get("items") or []
+        position = -1
+    client_id = payload.get("client") or request.remote_addr
+    status = prefetch_scheduler.update(items, position, client_id)
+    return jsonify({"ok": True, "online": _get_online_mode(), "items": status})
 
-    threading.Thread(target=_prefetch, daemon=True).start()
-    return jsonify({"ok": True})
+
+@app.route("/api/cache/prefetch/status")
+def api_cache_prefetch_status():
+    client_id = request.args.get("client") or request.remote_addr
+    return jsonify({"ok": True, "online": _get_online_mode(), "items": prefetch_scheduler.status(client_id)})
+
+
+def _send_from_time(key, path, start):
+    try:
+        start = float(start)
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid t"}), 400
+    # "inf" et "nan" passent float() mais pas le calcul de la trame.
+    if not math.isfinite(start):
+        return jsonify({"ok": False, "error": "invalid t"}), 400
+    start = max(0.0, start)
+    index = _load_seek_index(key, path)
+    if not index:
+        return jsonify({"ok": False, "error": "no seek index"}), 415
+    offsets = index["offsets"]
+    slot = min(len(offsets) - 1, int(start // index["step"]))
+    offset = offsets[slot]
+    size = index["size"]
+
+    def _stream():
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    resp = Response(_stream(), mimetype="audio/mpeg", direct_passthrough=True)
+    resp.content_length = size - offset
+    resp.headers["X-Start-Time"] = str(round(slot * index["step"], 3))
+    resp.headers["X-Content-Duration"] = str(index["duration"])
+    resp.set_etag(_media_etag(f"{key}@{offset}", size))
+    resp.cache_control.public = True
+    resp.cache_control.max_age = MEDIA_IMMUTABLE_MAX_AGE
+    resp.cache_control.immutable = True
+    return resp.make_conditional(request)
 
 
 @app.route("/api/cache/file")
@@ -1002,17 +4073,24 @@ def api_cache_file():
     key = request.args.get("key") or ""
     if not key:
         return jsonify({"ok": False, "error": "missing key"}), 400
-    path = _cache_path(key)
-    if not os.path.exists(path):
+    if request.args.get("stream") == "1":
+        # Octets du format source : même après promotion, on ne bascule pas sur le mp3.
+        return _proxy_stream(key)
+    path = _local_track_path(key)
+    if not path:
         return jsonify({"ok": False, "error": "not found"}), 404
-    return send_file(path, as_attachment=False)
+    start = request.args.get("t")
+    if start:
+        return _send_from_time(key, path, start)
+    return _send_media(path, key, max_age=MEDIA_IMMUTABLE_MAX_AGE, immutable=True)
 
 
 @app.route("/api/cache/list")
 def api_cache_list():
-    items = list(_load_json(CACHE_JSON, {}).values())
-    for item in items:
-        item["file_url"] = f"/api/cache/file?key={quote(item.get('id', ''))}"
+    items = [
+        dict(item, file_url=f"/api/cache/file?key={quote(item.get('id', ''))}")
+        for item in _load_json_shared(CACHE_JSON, {}).values()
+    ]
     return jsonify({"ok": True, "items": items})
 
 
@@ -1030,75 +4108,113 @@ def api_download():
     if not url:
         return jsonify({"ok": False, "error": "missing url"}), 400
 
-    safe_title = _safe_title(title)
-    path = _download_path(title)
+    _, error = _download_track(url, title, artist, cover_url)
+    if error:
+        return jsonify({"ok": False, "error": error}), 500
+    return jsonify({"ok": True, "id": _safe_title(title)})
 
-    with download_lock:
-        info, error = _yt_dlp_info(url, download=True, outtmpl=os.path.join(MUSIC_DIR, f"{safe_title}.%(ext)s"))
-    if not info:
-        return jsonify({"ok": False, "error": error or "download failed"}), 500
 
-    key = _cache_key(url, title)
-    if cover_url:
-        _save_cover_from_url(cover_url, key)
-    entry = {
-        "id": key,
-        "title": title,
-        "artist": artist,
-        "url": url,
-        "path": path,
-        "cover_path": _cover_path(key) if os.path.exists(_cover_path(key)) else None,
-        "downloaded": True,
-        "downloaded_at": int(time.time()),
-    }
-    _add_download_entry(entry)
-    _touch_cache_entry(key, dict(entry, last_played=time.time()))
-    return jsonify({"ok": True, "id": safe_title})
+@app.route("/api/download/bulk", methods=["POST"])
+def api_download_bulk():
+    payload = request.get_json(silent=True) or {}
+    playlist = (payload.get("playlist") or "").strip()
+    entry_id = (payload.get("id") or "").strip()
+    if not playlist and not entry_id:
+        return jsonify({"ok": False, "error": "missing playlist/id"}), 400
+    if not _get_online_mode():
+        return jsonify({"ok": False, "error": "offline"}), 400
+    source = {"playlist": playlist} if playlist else {"id": entry_id}
+    job_id = _start_download_job(source)
+    return jsonify({"ok": True, "job": job_id})
+
+
+@app.route("/api/download/bulk/status")
+def api_download_bulk_status():
+    job_id = request.args.get("job") or ""
+    with download_jobs_lock:
+        if not job_id:
+            return jsonify({"ok": True, "items": [_download_job_summary(j) for j in download_jobs.values()]})
+        job = download_jobs.get(job_id)
+        if job is None:
+            return jsonify({"ok": False, "error": "not found"}), 404
+        return jsonify({"ok": True, "job": _download_job_summary(job)})
 
 
 @app.route("/api/download/list")
 def api_download_list():
-    items = _load_json(DOWNLOADS_JSON, [])
-    for item in items:
-        if os.path.exists(_download_path(item.get("title") or "")):
-            item["file_url"] = f"/api/download/file?title={quote(item.get('title',''))}"
-        else:
-            item["file_url"] = None
+    items = []
+    for item in _load_json_shared(DOWNLOADS_JSON, []):
+        file_url = None
+        if _file_stat(item.get("path") or _download_path(item.get("title") or "")):
+            if item.get("id"):
+                file_url = f"/api/download/file?id={quote(item['id'])}"
+            else:
+                file_url = f"/api/download/file?title={quote(item.get('title',''))}"
+        items.append(dict(item, file_url=file_url))
     return jsonify({"ok": True, "items": items})
 
 
 @app.route("/api/download/file")
 def api_download_file():
+    key = request.args.get("id") or ""
     title = request.args.get("title") or ""
-    if not title:
-        return jsonify({"ok": False, "error": "missing title"}), 400
-    path = _download_path(title)
-    if not os.path.exists(path):
-        return jsonify({"ok": False, "error": "not found"}), 404
-    return send_file(path, as_attachment=False)
+    if key:
+        entry = next((d for d in _load_json_shared(DOWNLOADS_JSON, []) if d.get("id") == key), None)
+        if entry is None:
+            return jsonify({"ok": False, "error": "not found"}), 404
+        path = entry.get("path") or _download_path(entry.get("title") or "")
+    elif title:
+        path = _download_path(title)
+    else:
+        return jsonify({"ok": False, "error": "missing id"}), 400
+    # Un re-téléchargement réécrit le même nom : revalidation via ETag.
+    return _send_media(path, f"download:{os.path.basename(path)}")
 
 
 @app.route("/api/download/delete", methods=["POST"])
 def api_download_delete():
     payload = request.get_json(silent=True) or {}
+    key = payload.get("id")
     title = payload.get("title")
-    if not title:
+    if not key and not title:
         return jsonify({"ok": False, "error": "missing title"}), 400
-    path = _download_path(title)
-    if os.path.exists(path):
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-    downloads = _load_json(DOWNLOADS_JSON, [])
-    downloads = [d for d in downloads if d.get("title") != title]
-    _save_json(DOWNLOADS_JSON, downloads)
+    with downloads_lock:
+        downloads = _load_json(DOWNLOADS_JSON, [])
+        removed = [d for d in downloads if (d.get("id") == key if key else d.get("title") == title)]
+        for d in removed:
+            _remove_file(d.get("path") or _download_path(d.get("title") or ""))
+        if not key:
+            _remove_file(_download_path(title))
+        removed_keys = {d.get("id") for d in removed}
+        downloads = [d for d in downloads if d not in removed]
+        _save_json(DOWNLOADS_JSON, downloads)
+
+    # L'entrée de cache redevient une entrée ordinaire soumise au TTL.
+    with cache_db_lock:
+        cache = _load_json(CACHE_JSON, {})
+        changed = False
+        for key in removed_keys:
+            entry = cache.get(key)
+            if not entry or not entry.get("downloaded"):
+                continue
+            changed = True
+            if not _file_stat(_cache_path(key)):
+                # Fichier déplacé vers la bibliothèque (ancienne version) puis supprimé :
+                # plus rien à lire, l'entrée disparaît.
+                cache.pop(key)
+                _release_cover(key)
+                continue
+            entry["downloaded"] = False
+            entry["path"] = _cache_path(key)
+        if changed:
+            _save_json(CACHE_JSON, cache)
     return jsonify({"ok": True})
 
 
 @app.route("/api/playlists")
 def api_playlists():
-    items = _load_json(PLAYLIST_JSON, [])
+    # source_ids ne sert qu'à la synchronisation : inutile côté client.
+    items = [{k: v for k, v in p.items() if k != "source_ids"} for p in _load_json_shared(PLAYLIST_JSON, [])]
     return jsonify({"ok": True, "items": items})
 
 
@@ -1108,11 +4224,12 @@ def api_playlists_create():
     name = payload.get("name")
     if not name:
         return jsonify({"ok": False, "error": "missing name"}), 400
-    playlists = _load_json(PLAYLIST_JSON, [])
-    if any(p.get("name") == name for p in playlists):
-        return jsonify({"ok": False, "error": "exists"}), 400
-    playlists.append({"name": name, "items": []})
-    _save_json(PLAYLIST_JSON, playlists)
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        if any(p.get("name") == name for p in playlists):
+            return jsonify({"ok": False, "error": "exists"}), 400
+        playlists.append({"name": name, "items": []})
+        _save_json(PLAYLIST_JSON, playlists)
     return jsonify({"ok": True})
 
 
@@ -1123,13 +4240,15 @@ def api_playlists_add():
     item = payload.get("item")
     if not name or not item:
         return jsonify({"ok": False, "error": "missing name/item"}), 400
-    playlists = _load_json(PLAYLIST_JSON, [])
-    for pl in playlists:
-        if pl.get("name") == name:
-            pl["items"] = [i for i in pl.get("items", []) if i.get("id") != item.get("id")]
-            pl["items"].append(item)
-            break
-    _save_json(PLAYLIST_JSON, playlists)
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        for pl in playlists:
+            if pl.get("name") == name:
+                pl["items"] = [i for i in pl.get("items", []) if i.get("id") != item.get("id")]
+                pl["items"].append(item)
+                break
+        _save_json(PLAYLIST_JSON, playlists)
+    _radio_on_playlist_add(name, item)
     return jsonify({"ok": True})
 
 
@@ -1140,18 +4259,65 @@ def api_playlists_import():
     title = (payload.get("title") or "").strip() or "Playlist"
     if not entry_id:
         return jsonify({"ok": False, "error": "missing id"}), 400
+    if not _get_online_mode():
+        return jsonify({"ok": False, "error": "offline"}), 400
 
-    items, error = _resolve_playlist_tracks(entry_id, limit=100)
-    if items is None:
-        return jsonify({"ok": False, "error": error or "import failed"}), 500
-    if not items:
-        return jsonify({"ok": False, "error": "empty playlist"}), 400
-
-    playlists = _load_json(PLAYLIST_JSON, [])
-    final_name = _unique_playlist_name(playlists, title)
-    playlists.append({"name": final_name, "items": items})
-    _save_json(PLAYLIST_JSON, playlists)
-    return jsonify({"ok": True, "name": final_name, "count": len(items)})
+    # La playlist est créée tout de suite puis remplie par le job en arrière-plan.
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        final_name = _unique_playlist_name(playlists, title)
+        playlists.append({"name": final_name, "items": [], "source": entry_id})
+        _save_json(PLAYLIST_JSON, playlists)
+    job_id = _start_import_job(entry_id, final_name)
+    return jsonify({"ok": True, "name": final_name, "job": job_id, "count": 0})
+
+
+@app.route("/api/playlists/import/status")
+def api_playlists_import_status():
+    job_id = request.args.get("job") or ""
+    with import_jobs_lock:
+        if not job_id:
+            return jsonify({"ok": True, "items": [dict(j) for j in import_jobs.values()]})
+        job = import_jobs.get(job_id)
+        if job is None:
+            return jsonify({"ok": False, "error": "not found"}), 404
+        return jsonify({"ok": True, "job": dict(job)})
+
+
+@app.route("/api/playlists/sync", methods=["POST"])
+def api_playlists_sync():
+    payload = request.get_json(silent=True) or {}
+    if not _get_online_mode():
+        return jsonify({"ok": False, "error": "offline"}), 400
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+    sources = {p.get("name") for p in playlists if p.get("source")}
+    if payload.get("all"):
+        names = sorted(sources)
+    else:
+        names = payload.get("names") or ([payload["name"]] if payload.get("name") else [])
+    if not names:
+        return jsonify({"ok": False, "error": "missing name"}), 400
+    missing = [n for n in names if n not in sources]
+    if missing:
+        return jsonify({"ok": False, "error": "playlist not found or not imported", "names": missing}), 400
+    importing = [n for n in names if _import_running(n)]
+    if importing:
+        return jsonify({"ok": False, "error": "import in progress", "names": importing}), 409
+    jobs = [_start_sync_job(name) for name in names]
+    return jsonify({"ok": True, "jobs": jobs})
+
+
+@app.route("/api/playlists/sync/status")
+def api_playlists_sync_status():
+    name = request.args.get("name") or ""
+    with sync_jobs_lock:
+        if not name:
+            return jsonify({"ok": True, "items": [dict(j) for j in sync_jobs.values()]})
+        job = sync_jobs.get(name)
+        if job is None:
+            return jsonify({"ok": False, "error": "not found"}), 404
+        return jsonify({"ok": True, "job": dict(job)})
 
 
 @app.route("/api/playlists/remove", methods=["POST"])
@@ -1161,15 +4327,42 @@ def api_playlists_remove():
     item_id = payload.get("id")
     if not name or not item_id:
         return jsonify({"ok": False, "error": "missing name/id"}), 400
-    playlists = _load_json(PLAYLIST_JSON, [])
-    for pl in playlists:
-        if pl.get("name") == name:
-            pl["items"] = [i for i in pl.get("items", []) if i.get("id") != item_id]
-            break
-    _save_json(PLAYLIST_JSON, playlists)
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        for pl in playlists:
+            if pl.get("name") == name:
+                pl["items"] = [i for i in pl.get("items", []) if i.get("id") != item_id]
+                break
+        _save_json(PLAYLIST_JSON, playlists)
+    _invalidate_radio_index()
     return jsonify({"ok": True})
 
 
+@app.route("/api/playlists/batch", methods=["POST"])
+def api_playlists_batch():
+    payload = request.get_json(silent=True) or {}
+    ops = payload.get("ops")
+    if not isinstance(ops, list) or not ops:
+        return jsonify({"ok": False, "error": "missing ops"}), 400
+    if len(ops) > BATCH_MAX_OPS:
+        return jsonify({"ok": False, "error": f"too many ops (max {BATCH_MAX_OPS})"}), 400
+
+    # Tout ou rien : les opérations s'appliquent sur une copie, écrite seulement sans erreur.
+    with playlists_lock:
+        playlists = _load_json(PLAYLIST_JSON, [])
+        results = []
+        for op in ops:
+            error = _apply_playlist_op(playlists, op) if isinstance(op, dict) else "invalid op"
+            results.append({"ok": False, "error": error} if error else {"ok": True})
+        failed = sum(1 for r in results if not r["ok"])
+        applied = 0 if failed else len(results)
+        if applied:
+            _save_json(PLAYLIST_JSON, playlists)
+    if applied:
+        _invalidate_radio_index()
+    return jsonify({"ok": not failed, "applied": applied, "results": results})
+
+
 @app.route("/api/history")
 def api_history():
     return jsonify({"ok": True, "items": _load_json(HISTORY_JSON, [])})
@@ -1185,27 +4378,78 @@ def api_history_add():
     return jsonify({"ok": True})
 
 
+@app.route("/api/history/batch", methods=["POST"])
+def api_history_batch():
+    payload = request.get_json(silent=True) or {}
+    events = payload.get("items")
+    if not isinstance(events, list) or not events:
+        return jsonify({"ok": False, "error": "missing items"}), 400
+    if len(events) > BATCH_MAX_OPS:
+        return jsonify({"ok": False, "error": f"too many items (max {BATCH_MAX_OPS})"}), 400
+
+    # Tout ou rien, comme le lot de playlists : tout est validé avant la moindre écriture.
+    results = []
+    parsed = []
+    for event in events:
+        # Accepte {"item": {...}, "played_at": ts} ou directement l'item.
+        item = event.get("item") if isinstance(event, dict) and "item" in event else event
+        if not isinstance(item, dict) or not item.get("id"):
+            results.append({"ok": False, "error": "missing item"})
+            continue
+        played_at = event.get("played_at") or item.get("played_at")
+        try:
+            played_at = int(played_at) if played_at else None
+        except (TypeError, ValueError):
+            played_at = None
+        parsed.append((item, played_at))
+        results.append({"ok": True})
+    failed = sum(1 for r in results if not r["ok"])
+    applied = 0 if failed else len(parsed)
+    if applied:
+        with history_lock:
+            history = _load_json(HISTORY_JSON, [])
+            for item, played_at in parsed:
+                history = _merge_history(history, item, played_at)
+            _save_json(HISTORY_JSON, history)
+        _invalidate_radio_index()
+    return jsonify({"ok": not failed, "applied": applied, "results": results})
+
+
+@app.route("/api/radio", methods=["POST"])
+def api_radio():
+    # Suite de la file ("up next") calculée localement, utilisable hors ligne.
+    payload = request.get_json(silent=True) or {}
+    queue = [i for i in payload.get("queue") or [] if isinstance(i, dict)]
+    try:
+        position = int(payload.get("index", len(queue) - 1))
+        limit = max(1, min(100, int(payload.get("limit") or RADIO_LIMIT)))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "invalid index/limit"}), 400
+    if queue:
+        position = max(0, min(len(queue) - 1, position))
+        seeds = queue[max(0, position - RADIO_HISTORY_WINDOW + 1):position + 1][::-1]
+    else:
+        history = _load_json_shared(HISTORY_JSON, [])
+        seeds = history[:1]
+    exclude = {k for k in (_radio_key(i) for i in queue) if k}
+    online = _get_online_mode()
+    local_only = bool(payload.get("local")) or not online
+    items = _radio_candidates(seeds, exclude, limit, local_only=local_only, online=online)
+    return jsonify({"ok": True, "items": items, "seeds": [_radio_key(s) for s in seeds]})
+
+
 @app.route("/api/lyrics")
 def api_lyrics():
     title = request.args.get("title") or ""
     artist = request.args.get("artist") or ""
     if not title:
         return jsonify({"ok": False, "error": "missing title"}), 400
-    key = _safe_title(f"{title}-{artist}")
-    cache_path = os.path.join(CACHE_LYRICS_DIR, f"{key}.json")
-    if os.path.exists(cache_path):
-        return jsonify({"ok": True, "data": _load_json(cache_path, {}), "cached": True})
-    if not _get_online_mode():
-        return jsonify({"ok": False, "error": "offline"}), 400
-    if syncedlyrics is None:
-        return jsonify({"ok": False, "error": "syncedlyrics not installed"}), 500
-    try:
-        synced = syncedlyrics.search(f"{title} {artist}")
-        data = {"title": title, "artist": artist, "synced": synced}
-        _save_json(cache_path, data)
-        return jsonify({"ok": True, "data": data, "cached": False})
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+    data, error, cached = _get_lyrics(title, artist)
+    if data is None:
+        if error == "offline":
+            return jsonify({"ok": False, "error": error}), 400
+        return jsonify({"ok": False, "error": error or "lyrics failed"}), 500
+    return jsonify({"ok": True, "data": data, "cached": cached})
 
 
 @app.route("/api/cover")
@@ -1214,9 +4458,7 @@ def api_cover():
     if not key:
         return jsonify({"ok": False, "error": "missing key"}), 400
     path = _cover_path(key)
-    if not os.path.exists(path):
-        return jsonify({"ok": False, "error": "not found"}), 404
-    return send_file(path, as_attachment=False)
+    return _send_media(path, f"cover:{os.path.basename(path)}", max_age=COVER_MAX_AGE)
 
 
 @app.route("/api/playback", methods=["GET", "POST"])
@@ -1284,7 +4526,14 @@ def api_remote_available():
 
 @app.route("/api/devices")
 def api_devices():
-    return jsonify({"ok": True, "items": _load_devices()})
+    _ensure_device_prober()
+    if request.args.get("refresh") == "1":
+        device_probe_wakeup.set()
+    items = _load_devices()
+    with device_status_lock:
+        for item in items:
+            item["status"] = device_status.get(item.get("id"))
+    return jsonify({"ok": True, "items": items})
 
 
 @app.route("/api/devices/add", methods=["POST"])
@@ -1300,6 +4549,8 @@ def api_devices_add():
     devices = [d for d in devices if d.get("id") != device_id]
     devices.append({"id": device_id, "name": name, "host": host, "port": int(port)})
     _save_devices(devices)
+    _ensure_device_prober()
+    device_probe_wakeup.set()
     return jsonify({"ok": True})
 
 
@@ -1312,9 +4563,49 @@ def api_devices_remove():
     devices = _load_devices()
     devices = [d for d in devices if d.get("id") != device_id]
     _save_devices(devices)
+    with device_status_lock:
+        device_status.pop(device_id, None)
+    device_probe_wakeup.set()
     return jsonify({"ok": True})
 
 
-if __name__ == "__main__":
+def _wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _startup_tasks(port):
+    # Maintenance et préchargement après l'ouverture du port : le serveur répond tout de suite.
+    _wait_for_port(port)
+    # Première sonde tout de suite : la table est prête avant le premier /api/devices.
+    _ensure_device_prober()
+    _reconcile_storage()
     _cleanup_cache()
-    app.run(host="0.0.0.0", port=5050, debug=True)
+    _resume_cache_fills()
+    _resume_download_jobs()
+    if PLAYLIST_SYNC_INTERVAL > 0:
+        threading.Thread(target=_playlist_sync_loop, daemon=True).start()
+    if WARMUP_ENABLED:
+        _lazy_import("yt_dlp")
+        _get_lyrics_providers()
+        _get_ytmusic_client()
+
+
+def _is_reloader_parent():
+    # En debug, le processus parent du reloader ne sert aucune requête.
+    return app.debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+
+
+if __name__ == "__main__":
+    app.debug = os.getenv("DEBUG", "1") == "1"
+    if not _is_reloader_parent():
+        # Migration des clés avant d'ouvrir le port : aucune requête ne voit les anciennes clés.
+        _migrate_cache_keys()
+        threading.Thread(target=_startup_tasks, args=(PORT,), daemon=True).start()
+    app.run(host="0.0.0.0", port=PORT, debug=app.debug)
@@ -32,6 +32,7 @@ const barQueue = document.getElementById('bar-queue');
 
 const searchInput = document.getElementById('search-input');
 const searchBtn = document.getElementById('search-btn');
+const searchSuggestions = document.getElementById('search-suggestions');
 const searchResults = document.getElementById('search-results');
 const searchContext = document.getElementById('search-context');
 const searchBackBtn = document.getElementById('search-back-btn');
@@ -92,6 +93,11 @@ let searchStack = [];
 let lyricsLines = [];
 let lyricsIndex = -1;
 let pendingPlaylistItem = null;
+let searchController = null;
+let searchSeq = 0;
+let suggestController = null;
+let typingTimer = null;
+const clientId = Math.random().toString(36).slice(2, 12);
 
 const DEFAULT_COVER = '/static/default-cover.png';
 const ICONS = {
@@ -153,6 +159,10 @@ async function apiFetch(path, options = {}) {
   let timeoutId = null;
   if (controller) {
     timeoutId = setTimeout(() => controller.abort(), timeoutMs);
+    if (fetchOptions.signal) {
+      fetchOptions.signal.addEventListener('abort', () => controller.abort());
+      delete fetchOptions.signal;
+    }
   }
   try {
     const res = await fetch(path, {
@@ -202,6 +212,7 @@ function renderQueue() {
       queue.splice(index, 1);
       if (currentIndex >= index) currentIndex = Math.max(0, currentIndex - 1);
       renderQueue();
+      syncPrefetch();
     });
     card.querySelector('[data-action="playlist"]').addEventListener('click', (e) => {
       e.stopPropagation();
@@ -255,7 +266,7 @@ function renderSearch(items) {
           <button data-action="download">Download</button>
         `
       : canOpenTracks
-        ? `${isPlaylist ? '<button data-action="import">+ Mes playlists</button>' : ''}<button data-action="open">Voir titres</button>`
+        ? `${isPlaylist ? '<button data-action="import">+ Mes playlists</button><button data-action="download-all">Tout télécharger</button>' : ''}<button data-action="open">Voir titres</button>`
         : '';
     card.innerHTML = `
       <img src="${item.cover || DEFAULT_COVER}" alt="cover" />
@@ -287,6 +298,10 @@ function renderSearch(items) {
           e.stopPropagation();
           await importPlaylistResult(item);
         });
+        card.querySelector('[data-action="download-all"]').addEventListener('click', (e) => {
+          e.stopPropagation();
+          downloadAll({ id: item.id }, item.title);
+        });
       }
       card.querySelector('[data-action="open"]').addEventListener('click', async (e) => {
         e.stopPropagation();
@@ -381,8 +396,18 @@ function renderPlaylists(playlists) {
       <h4>${pl.name}</h4>
       <div>${pl.items.length} titres</div>
       <button data-action="play">Lire</button>
+      <button data-action="download-all">Tout télécharger</button>
+      ${pl.source ? '<button data-action="sync">Synchroniser</button>' : ''}
       <div class="playlist-items"></div>
     `;
+    if (pl.source) {
+      card.querySelector('[data-action="sync"]').addEventListener('click', () => {
+        syncPlaylist(pl.name);
+      });
+    }
+    card.querySelector('[data-action="download-all"]').addEventListener('click', () => {
+      downloadAll({ playlist: pl.name }, pl.name);
+    });
     card.querySelector('[data-action="play"]').addEventListener('click', () => {
       queue = [...pl.items];
       currentIndex = -1;
@@ -434,12 +459,27 @@ function addToQueue(item, autofill = false, isDownloaded = false) {
         if (!queue.find((q) => q.id === it.id)) queue.push(it);
       });
     }
-    apiFetch('/api/cache/prefetch', {
-      method: 'POST',
-      body: JSON.stringify({ items: nextItems }),
-    });
   }
   renderQueue();
+  syncPrefetch();
+}
+
+function syncPrefetch() {
+  if (!queue.length) return;
+  apiFetch('/api/cache/prefetch', {
+    method: 'POST',
+    body: JSON.stringify({
+      client: clientId,
+      index: currentIndex,
+      queue: queue.map((it) => ({
+        url: it.url,
+        title: it.title,
+        artist: it.artist,
+        cover: it.cover,
+        file_url: it.file_url,
+      })),
+    }),
+  }).catch(() => {});
 }
 
 async function playAtIndex(index, attempted = new Set()) {
@@ -448,9 +488,11 @@ async function playAtIndex(index, attempted = new Set()) {
   currentIndex = index;
   const item = queue[index];
   setNowPlaying(item);
+  syncPrefetch();
   nowStatus.textContent = 'Chargement...';
 
   let fileUrl = item.file_url;
+  streamPromotion = null;
   if (!fileUrl) {
     const res = await apiFetch('/api/cache/play', {
       method: 'POST',
@@ -474,6 +516,7 @@ async function playAtIndex(index, attempted = new Set()) {
       return;
     }
     fileUrl = res.file_url;
+    if (res.stream) streamPromotion = { key: res.key, after: res.promote_after, item };
   }
 
   audio.src = fileUrl;
@@ -500,6 +543,50 @@ async function playAtIndex(index, attempted = new Set()) {
   });
 
   fetchLyrics(item);
+  if (currentIndex === queue.length - 1 && !isLoop) extendQueueWithRadio();
+}
+
+let radioPending = null;
+let streamPromotion = null;
+
+function checkStreamPromotion() {
+  // Lecture en flux direct : le titre n'entre dans le cache qu'une fois vraiment écouté.
+  if (!streamPromotion || audio.currentTime < streamPromotion.after) return;
+  const { key, item } = streamPromotion;
+  streamPromotion = null;
+  apiFetch('/api/cache/promote', {
+    method: 'POST',
+    body: JSON.stringify({ key, url: item.url, title: item.title, artist: item.artist, cover: item.cover }),
+  }).catch(() => {});
+}
+
+function extendQueueWithRadio() {
+  // Fin de file : suite calculée localement (historique, playlists, cache).
+  if (radioPending) return radioPending;
+  radioPending = apiFetch('/api/radio', {
+    method: 'POST',
+    body: JSON.stringify({
+      index: currentIndex,
+      queue: queue.map((it) => ({ url: it.url, title: it.title, artist: it.artist, id: it.id })),
+      limit: 10,
+    }),
+  })
+    .then((res) => {
+      if (!res.ok || !res.items?.length) return 0;
+      const known = new Set(queue.map((it) => it.url));
+      const added = res.items.filter((it) => !known.has(it.url));
+      added.forEach((it) => queue.push(it));
+      if (added.length) {
+        renderQueue();
+        syncPrefetch();
+      }
+      return added.length;
+    })
+    .catch(() => 0)
+    .finally(() => {
+      radioPending = null;
+    });
+  return radioPending;
 }
 
 function nextTrack() {
@@ -513,6 +600,10 @@ function nextTrack() {
     playAtIndex(currentIndex + 1);
   } else if (isLoop) {
     playAtIndex(0);
+  } else {
+    extendQueueWithRadio().then((added) => {
+      if (added) playAtIndex(currentIndex + 1);
+    });
   }
 }
 
@@ -561,14 +652,19 @@ function ensureAtLeastOneFilter(changedInput) {
   return false;
 }
 
-async function loadSearch() {
+async function loadSearch(live = false) {
   const q = searchInput.value.trim();
   if (!q) return;
+  clearTimeout(typingTimer);
+  if (searchController) searchController.abort();
+  searchController = new AbortController();
+  const seq = ++searchSeq;
   try {
     const selectedTypes = getSearchTypes();
     const typesParam = selectedTypes.join(',');
-    const path = `/api/search?q=${encodeURIComponent(q)}${typesParam ? `&types=${encodeURIComponent(typesParam)}` : ''}`;
-    const res = await apiFetch(path, { timeoutMs: 20000 });
+    const path = `/api/search?q=${encodeURIComponent(q)}${typesParam ? `&types=${encodeURIComponent(typesParam)}` : ''}&client=${clientId}${live === true ? '&live=1' : ''}`;
+    const res = await apiFetch(path, { timeoutMs: 20000, signal: searchController.signal });
+    if (seq !== searchSeq || res.error === 'superseded') return;
     if (!res.ok) {
       searchResults.innerHTML = `<div class="track"><div><h4>Recherche impossible</h4><span>${res.error || 'Vérifie la connexion ou yt-dlp.'}</span></div></div>`;
       return;
@@ -578,6 +674,7 @@ async function loadSearch() {
     renderSearch(res.items);
     updateSearchContext();
   } catch (e) {
+    if (seq !== searchSeq) return;
     searchResults.innerHTML = '<div class="track"><div><h4>Erreur réseau</h4><span>Le serveur ne répond pas.</span></div></div>';
   }
 }
@@ -606,6 +703,35 @@ async function loadExpandedSearch(item) {
   }
 }
 
+async function loadSuggestions() {
+  const q = searchInput.value.trim();
+  if (!searchSuggestions || q.length < 2) return;
+  if (suggestController) suggestController.abort();
+  suggestController = new AbortController();
+  try {
+    const res = await apiFetch(`/api/search/suggest?q=${encodeURIComponent(q)}`, {
+      timeoutMs: 5000,
+      signal: suggestController.signal,
+    });
+    if (!res.ok || searchInput.value.trim() !== q) return;
+    searchSuggestions.innerHTML = '';
+    res.items.forEach((text) => {
+      const option = document.createElement('option');
+      option.value = text;
+      searchSuggestions.appendChild(option);
+    });
+  } catch (e) {
+    // Requête annulée par une frappe plus récente.
+  }
+}
+
+function onSearchTyping() {
+  loadSuggestions();
+  clearTimeout(typingTimer);
+  if (searchInput.value.trim().length < 3) return;
+  typingTimer = setTimeout(() => loadSearch(true), 600);
+}
+
 function goBackSearchContext() {
   if (!searchStack.length) return;
   const prev = searchStack.pop();
@@ -626,13 +752,83 @@ async function importPlaylistResult(item) {
       showToast(res.error || 'Import playlist impossible.', 'error');
       return;
     }
+    showToast(`Import en cours: ${res.name}`, 'info', 2400);
     await loadPlaylists();
-    showToast(`Playlist ajoutée: ${res.name} (${res.count} titres)`, 'info');
+    if (res.job) watchImportJob(res.job);
   } catch (e) {
     showToast('Erreur réseau pendant l’import playlist.', 'error');
   }
 }
 
+async function watchImportJob(jobId) {
+  let lastCount = -1;
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    let res;
+    try {
+      res = await apiFetch(`/api/playlists/import/status?job=${encodeURIComponent(jobId)}`);
+    } catch (e) {
+      continue;
+    }
+    if (!res.ok) return;
+    const job = res.job;
+    if (job.count !== lastCount) {
+      lastCount = job.count;
+      loadPlaylists();
+    }
+    if (job.status === 'done') {
+      showToast(`Playlist ajoutée: ${job.name} (${job.count} titres)`, 'info');
+      return;
+    }
+    if (job.status === 'error') {
+      loadPlaylists();
+      showToast(job.error || 'Import playlist impossible.', 'error');
+      return;
+    }
+  }
+}
+
+async function syncPlaylist(name) {
+  let res;
+  try {
+    res = await apiFetch('/api/playlists/sync', {
+      method: 'POST',
+      body: JSON.stringify({ name }),
+    });
+  } catch (e) {
+    showToast('Erreur réseau pendant la synchronisation.', 'error');
+    return;
+  }
+  if (!res.ok) {
+    showToast(res.error || 'Synchronisation impossible.', 'error');
+    return;
+  }
+  showToast(`Synchronisation: ${name}`, 'info', 2400);
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    try {
+      res = await apiFetch(`/api/playlists/sync/status?name=${encodeURIComponent(name)}`);
+    } catch (e) {
+      continue;
+    }
+    if (!res.ok) return;
+    const job = res.job;
+    if (job.status === 'done') {
+      await loadPlaylists();
+      if (job.added || job.removed) {
+        showToast(`${name}: +${job.added} / -${job.removed} titres`, 'info');
+      } else {
+        showToast(`${name}: déjà à jour`, 'info', 2400);
+      }
+      return;
+    }
+    if (job.status === 'error') {
+      showToast(job.error || 'Synchronisation impossible.', 'error');
+      return;
+    }
+  }
+}
+
 async function loadPlaylists() {
   const res = await apiFetch('/api/playlists');
   if (res.ok) renderPlaylists(res.items);
@@ -675,6 +871,13 @@ async function fetchLyrics(item) {
   }
   const synced = res.data.synced || '';
   lyricsLines = parseSyncedLyrics(synced);
+  const plain = res.data.plain || (!lyricsLines.length ? synced : '');
+  if (!lyricsLines.length && plain.trim()) {
+    const html = plain.split('\n').map((line) => `<p>${line}</p>`).join('');
+    lyricsBody.innerHTML = html;
+    if (lyricsBodyDesktop) lyricsBodyDesktop.innerHTML = html;
+    return;
+  }
   if (!lyricsLines.length) {
     lyricsBody.innerHTML = '<p class="muted">Lyrics non synchronisés.</p>';
     if (lyricsBodyDesktop) lyricsBodyDesktop.innerHTML = '<p class="muted">Lyrics non synchronisés.</p>';
@@ -748,6 +951,50 @@ async function downloadItem(item) {
   return true;
 }
 
+async function downloadAll(source, label) {
+  let res;
+  try {
+    res = await apiFetch('/api/download/bulk', {
+      method: 'POST',
+      body: JSON.stringify(source),
+    });
+  } catch (e) {
+    showToast('Erreur réseau pendant le téléchargement.', 'error');
+    return;
+  }
+  if (!res.ok) {
+    showToast(res.error || 'Téléchargement impossible.', 'error');
+    return;
+  }
+  showToast(`Téléchargement lancé: ${label}`, 'info', 2400);
+  let lastDone = -1;
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+    let status;
+    try {
+      status = await apiFetch(`/api/download/bulk/status?job=${encodeURIComponent(res.job)}`);
+    } catch (e) {
+      continue;
+    }
+    if (!status.ok) return;
+    const job = status.job;
+    const finished = job.done + job.skipped;
+    if (finished !== lastDone) {
+      lastDone = finished;
+      loadDownloads();
+    }
+    if (job.status === 'error') {
+      showToast(job.error || 'Téléchargement impossible.', 'error');
+      return;
+    }
+    if (job.status === 'done') {
+      const failed = job.failed ? `, ${job.failed} en échec` : '';
+      showToast(`${label}: ${finished}/${job.total} titres hors ligne${failed}`, job.failed ? 'error' : 'info');
+      return;
+    }
+  }
+}
+
 async function promptAddToPlaylist(item) {
   if (item?.type && item.type !== 'track') {
     showToast('Seuls les tracks peuvent être ajoutés à une playlist.', 'info');
@@ -810,10 +1057,17 @@ async function loadDevices() {
   res.items.forEach((device) => {
     const row = document.createElement('div');
     row.className = 'track';
+    const status = device.status;
+    let statusLabel = 'Vérification...';
+    if (status) {
+      statusLabel = status.reachable
+        ? `En ligne · ${Math.round(status.latency_ms)} ms`
+        : 'Hors ligne';
+    }
     row.innerHTML = `
       <div>
         <h4>${device.name}</h4>
-        <span>${device.host}:${device.port}</span>
+        <span>${device.host}:${device.port} · ${statusLabel}</span>
         <div class="actions">
           <button data-action="remove">Supprimer</button>
         </div>
@@ -869,10 +1123,11 @@ loopBtn.addEventListener('click', () => {
   syncControlIcons();
 });
 
-searchBtn.addEventListener('click', loadSearch);
+searchBtn.addEventListener('click', () => loadSearch());
 searchInput.addEventListener('keydown', (e) => {
   if (e.key === 'Enter') loadSearch();
 });
+searchInput.addEventListener('input', onSearchTyping);
 if (searchBackBtn) {
   searchBackBtn.addEventListener('click', goBackSearchContext);
 }
@@ -917,6 +1172,7 @@ barProgress.addEventListener('input', () => {
 
 audio.addEventListener('timeupdate', syncProgress);
 audio.addEventListener('timeupdate', syncLyrics);
+audio.addEventListener('timeupdate', checkStreamPromotion);
 audio.addEventListener('ended', nextTrack);
 audio.addEventListener('play', syncControlIcons);
 audio.addEventListener('pause', syncControlIcons);
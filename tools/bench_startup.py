@@ -0,0 +1,84 @@
+"""Mesure le temps de démarrage de NeoBelieve (time-to-first-response).
+
+Usage : python tools/bench_startup.py [--runs 5] [--path /api/status]
+
+Chaque run lance `app.py` dans un nouveau processus (DEBUG=0, port libre)
+et chronomètre le délai jusqu'à la première réponse HTTP 200.
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _measure(path, timeout, env_extra):
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), DEBUG="0", **env_extra)
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, APP_PATH],
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"app.py exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"no response from {url} after {timeout}s")
+    finally:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/status")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--no-warmup", action="store_true", help="désactive le préchargement (WARMUP=0)")
+    args = parser.parse_args()
+
+    env_extra = {"WARMUP": "0"} if args.no_warmup else {}
+    results = []
+    for i in range(args.runs):
+        elapsed = _measure(args.path, args.timeout, env_extra)
+        results.append(elapsed)
+        print(f"run {i + 1}: {elapsed * 1000:.1f} ms")
+
+    print(
+        f"time-to-first-response {args.path}: "
+        f"min {min(results) * 1000:.1f} ms, "
+        f"median {statistics.median(results) * 1000:.1f} ms, "
+        f"max {max(results) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
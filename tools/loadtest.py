@@ -0,0 +1,447 @@
+"""Test de charge de NeoBelieve : plusieurs clients simultanés sur les vraies routes.
+
+Usage : python tools/loadtest.py [--duration 20] [--users ui=4,remote=2,listener=4]
+
+Par défaut l'application tourne dans ce processus (serveur Werkzeug multi-thread,
+données dans un dossier temporaire) avec des services amont simulés : yt-dlp,
+ytmusicapi, syncedlyrics et les miniatures répondent après --upstream-latency ms
+sans accès réseau. Avec --url, les clients visent un serveur déjà lancé (sans
+simulation : attention, les routes d'écriture modifient ses données).
+
+Profils de clients :
+  ui        interface qui rafraîchit historique, playlists, téléchargements, statut
+  remote    device distant qui interroge /api/remote/next et /api/playback
+  listener  utilisateur qui cherche, lance des titres, lit le fichier, télécharge
+
+Le rapport donne par endpoint le débit, les latences p50/p95/p99/max et les
+taux d'erreur (5xx et échecs de connexion ; les 4xx sont comptés à part).
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+from io import BytesIO
+from urllib.parse import parse_qs, quote, urlparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+WORDS = ["night", "love", "city", "fire", "dream", "ocean", "summer", "ghost", "gold", "rain", "neon", "echo"]
+# Trame MPEG-1 Layer III 128 kbit/s 44,1 kHz : assez pour l'index de seek.
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x00]) + bytes(413)
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.client_errors = defaultdict(int)
+
+    def record(self, name, elapsed, status):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if status is None or status >= 500:
+                self.errors[name] += 1
+            elif status >= 400:
+                self.client_errors[name] += 1
+
+
+def _percentile(values, pct):
+    # Rang le plus proche, sur une liste triée.
+    if not values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+class _Client:
+    def __init__(self, host, port, stats, name):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.name = name
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None, label=None):
+        label = label or f"{method} {path.split('?', 1)[0]}"
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        started = time.perf_counter()
+        status = None
+        data = None
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+                self.conn.request(method, path, body=payload, headers=headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                status = resp.status
+                break
+            except (OSError, http.client.HTTPException):
+                # Connexion keep-alive fermée par le serveur : un seul nouvel essai.
+                self.close()
+                if attempt:
+                    break
+        self.stats.record(label, time.perf_counter() - started, status)
+        if status is None or not data:
+            return status, None
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _ui_session(client, rng, deadline, think):
+    paths = ["/api/history", "/api/playlists", "/api/download/list", "/api/cache/list", "/api/status"]
+    while time.time() < deadline:
+        for path in paths:
+            client.request("GET", path)
+        if rng.random() < 0.2:
+            _, data = client.request("GET", "/api/history")
+            items = (data or {}).get("items") or []
+            if items:
+                client.request("POST", "/api/playlists/add", {"name": "Load test", "item": rng.choice(items)})
+        time.sleep(think * rng.uniform(0.5, 1.5))
+
+
+def _remote_session(client, rng, deadline, think):
+    position = 0.0
+    while time.time() < deadline:
+        client.request("GET", "/api/remote/next")
+        position += think
+        client.request(
+            "POST",
+            "/api/playback",
+            {"id": client.name, "currentTime": position, "duration": 180, "status": "playing"},
+        )
+        client.request("GET", "/api/playback")
+        if rng.random() < 0.1:
+            client.request("POST", "/api/remote", {"action": rng.choice(["next", "prev", "toggle"])})
+        time.sleep(think * rng.uniform(0.5, 1.5))
+
+
+def _listener_session(client, rng, deadline, think, download_ratio):
+    while time.time() < deadline:
+        query = " ".join(rng.sample(WORDS, 2))
+        _, data = client.request("GET", f"/api/search?q={quote(query)}&types=track&client={client.name}")
+        items = [i for i in (data or {}).get("items") or [] if i.get("url")]
+        if not items:
+            time.sleep(think)
+            continue
+        index = rng.randrange(len(items))
+        track = items[index]
+        _, played = client.request(
+            "POST",
+            "/api/cache/play",
+            {"url": track["url"], "title": track.get("title"), "artist": track.get("artist"), "cover": track.get("cover")},
+        )
+        client.request("POST", "/api/cache/prefetch", {"queue": items, "index": index})
+        if played and played.get("file_url"):
+            client.request("GET", played["file_url"], headers={"Range": "bytes=0-65535"})
+            client.request("GET", f"/api/cover?key={quote(played.get('key') or '')}")
+        client.request("POST", "/api/history/add", {"item": track})
+        if rng.random() < 0.3:
+            client.request("GET", f"/api/lyrics?title={quote(track.get('title') or '')}&artist={quote(track.get('artist') or '')}")
+        if rng.random() < download_ratio:
+            client.request(
+                "POST",
+                "/api/download",
+                {"url": track["url"], "title": track.get("title"), "artist": track.get("artist"), "cover": track.get("cover")},
+            )
+        time.sleep(think * rng.uniform(0.5, 1.5))
+
+
+def _video_id(seed):
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return "".join(alphabet[b % 64] for b in digest[:11])
+
+
+def _install_stubs(app, latency, track_pool, mp3_frames):
+    """Remplace les services amont par des simulations locales."""
+    tracks = [(_video_id(f"track-{i}"), f"Track {i}", f"Artist {i % 17}") for i in range(track_pool)]
+    by_id = {vid: (title, artist) for vid, title, artist in tracks}
+    audio = MP3_FRAME * mp3_frames
+
+    class FakeYoutubeDL:
+        def __init__(self, opts):
+            self.opts = opts
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False):
+            time.sleep(latency)
+            parsed = urlparse(url)
+            if parsed.path == "/search":
+                query = parse_qs(parsed.query).get("q", [""])[0]
+                rng = random.Random(query)
+                limit = self.opts.get("playlistend") or 10
+                entries = []
+                for vid, title, artist in rng.sample(tracks, min(limit, len(tracks))):
+                    entries.append(
+                        {"id": vid, "url": f"https://music.youtube.com/watch?v={vid}", "title": title, "uploader": artist}
+                    )
+                return {"entries": entries}
+            vid = parse_qs(parsed.query).get("v", [""])[0]
+            title, artist = by_id.get(vid, (vid, ""))
+            info = {"id": vid, "title": title, "uploader": artist, "duration": 180}
+            if download:
+                # Le téléchargement simulé dure plus longtemps qu'une extraction.
+                time.sleep(latency * 3)
+                path = self.opts["outtmpl"].replace("%(ext)s", "mp3")
+                with open(path, "wb") as f:
+                    f.write(audio)
+                info["requested_downloads"] = [{"filepath": path}]
+            return info
+
+    class FakeYTMusic:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def get_search_suggestions(self, query):
+            time.sleep(latency)
+            return [f"{query} {word}" for word in WORDS[:5]]
+
+        def __getattr__(self, name):
+            def _call(*args, **kwargs):
+                time.sleep(latency)
+                return {}
+
+            return _call
+
+    class FakeResponse:
+        status_code = 200
+
+        def __init__(self, content):
+            self.content = content
+
+    def _jpeg(split):
+        # Image unie pour les pochettes, bicolore pour la miniature "vide" de référence.
+        try:
+            from PIL import Image
+
+            img = Image.new("RGB", (32, 32), (200, 40, 90))
+            if split:
+                img.paste((0, 0, 0), (0, 0, 16, 32))
+            buf = BytesIO()
+            img.save(buf, "JPEG")
+            return buf.getvalue()
+        except Exception:
+            return b"\xff\xd8\xff\xd9"
+
+    thumb = _jpeg(False)
+    bad_thumb = _jpeg(True)
+
+    def fake_thumb_request(url):
+        time.sleep(latency)
+        return FakeResponse(bad_thumb if url == app.BAD_THUMB_URL else thumb)
+
+    class FakeLyricsProvider:
+        def get_lrc(self, query):
+            time.sleep(latency)
+            return types.SimpleNamespace(synced=f"[00:00.00] {query}", unsynced=None)
+
+    app.lazy_modules[("yt_dlp", None)] = types.SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+    app.lazy_modules[("ytmusicapi", "YTMusic")] = FakeYTMusic
+    app.lazy_modules[("syncedlyrics.providers", None)] = types.SimpleNamespace(
+        **{name: FakeLyricsProvider for name in app.LYRICS_PROVIDERS}
+    )
+    app._thumb_request = fake_thumb_request
+    return tracks
+
+
+def _relocate_data(app, data_dir):
+    # Toutes les constantes de chemin sont lues à l'appel : on les redirige.
+    old = app.DATA_DIR
+    for name in dir(app):
+        value = getattr(app, name)
+        if name.isupper() and isinstance(value, str) and value.startswith(old):
+            setattr(app, name, data_dir + value[len(old):])
+    app.INDEXED_DIRS = (app.CACHE_MUSIC_DIR, app.MUSIC_DIR, app.COVERS_DIR)
+    for path in (app.DB_DIR, app.CACHE_MUSIC_DIR, app.CACHE_LYRICS_DIR, app.MUSIC_DIR, app.COVERS_DIR):
+        os.makedirs(path, exist_ok=True)
+
+
+def _start_local_server(args):
+    sys.path.insert(0, BASE_DIR)
+    import app
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    data_dir = tempfile.mkdtemp(prefix="neobelieve-load-")
+    _relocate_data(app, data_dir)
+    tracks = _install_stubs(app, args.upstream_latency / 1000, args.tracks, args.mp3_frames)
+
+    # Une partie du catalogue est déjà en cache, comme sur une instance utilisée.
+    seeded = tracks[: int(len(tracks) * args.seed_cached)]
+    for vid, title, artist in seeded:
+        with open(app._cache_path(vid), "wb") as f:
+            f.write(MP3_FRAME * args.mp3_frames)
+        app._touch_cache_entry(
+            vid,
+            {
+                "id": vid,
+                "title": title,
+                "artist": artist,
+                "url": f"https://music.youtube.com/watch?v={vid}",
+                "path": app._cache_path(vid),
+                "cover_path": None,
+                "last_played": time.time(),
+                "downloaded": False,
+            },
+        )
+    app._save_json(app.PLAYLIST_JSON, [{"name": "Load test", "items": []}])
+    app._reconcile_storage()
+
+    class Handler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True, request_handler=Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, data_dir
+
+
+def _parse_users(spec):
+    users = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        profile, _, count = part.partition("=")
+        profile = profile.strip()
+        if profile not in {"ui", "remote", "listener"}:
+            raise SystemExit(f"unknown profile: {profile}")
+        users[profile] = int(count or 1)
+    return users
+
+
+def _report(stats, elapsed):
+    rows = []
+    total = errors = client_errors = 0
+    for name in sorted(stats.latencies):
+        values = sorted(stats.latencies[name])
+        count = len(values)
+        total += count
+        errors += stats.errors[name]
+        client_errors += stats.client_errors[name]
+        rows.append(
+            {
+                "endpoint": name,
+                "count": count,
+                "rps": count / elapsed,
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "error_rate": stats.errors[name] / count,
+                "client_error_rate": stats.client_errors[name] / count,
+            }
+        )
+
+    width = max([len(r["endpoint"]) for r in rows] + [8])
+    print(
+        f"{'endpoint':<{width}} {'count':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'5xx%':>6} {'4xx%':>6}"
+    )
+    for r in rows:
+        print(
+            f"{r['endpoint']:<{width}} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['error_rate'] * 100:>6.1f} {r['client_error_rate'] * 100:>6.1f}"
+        )
+    print(
+        f"total: {total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s, "
+        f"5xx/failed {errors}, 4xx {client_errors} (latencies in ms)"
+    )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="durée du test en secondes")
+    parser.add_argument("--users", default="ui=4,remote=2,listener=4", help="profil=nombre, séparés par des virgules")
+    parser.add_argument("--think", type=float, default=0.2, help="pause moyenne entre deux actions (s)")
+    parser.add_argument("--download-ratio", type=float, default=0.1, help="part des lectures suivies d'un téléchargement")
+    parser.add_argument("--url", help="serveur existant (ex. http://127.0.0.1:5050), sans simulation amont")
+    parser.add_argument("--upstream-latency", type=float, default=50, help="latence simulée des services amont (ms)")
+    parser.add_argument("--tracks", type=int, default=200, help="taille du catalogue simulé")
+    parser.add_argument("--seed-cached", type=float, default=0.3, help="part du catalogue déjà en cache au départ")
+    parser.add_argument("--mp3-frames", type=int, default=400, help="taille des fichiers simulés, en trames MP3")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit aussi le rapport dans ce fichier")
+    parser.add_argument("--keep-data", action="store_true", help="conserve le dossier de données temporaire")
+    args = parser.parse_args()
+
+    users = _parse_users(args.users)
+    server = data_dir = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        server, data_dir = _start_local_server(args)
+        host, port = server.host, server.port
+
+    stats = _Stats()
+    deadline = time.time() + args.duration
+    threads = []
+    clients = []
+    for profile, count in users.items():
+        for i in range(count):
+            client = _Client(host, port, stats, f"{profile}-{i}")
+            clients.append(client)
+            rng = random.Random(f"{args.seed}-{profile}-{i}")
+            if profile == "ui":
+                target, extra = _ui_session, ()
+            elif profile == "remote":
+                target, extra = _remote_session, ()
+            else:
+                target, extra = _listener_session, (args.download_ratio,)
+            threads.append(threading.Thread(target=target, args=(client, rng, deadline, args.think) + extra, daemon=True))
+
+    print(f"load test: {', '.join(f'{p}={c}' for p, c in users.items())} for {args.duration:.0f}s against {host}:{port}")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.close()
+
+    rows = _report(stats, elapsed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"users": users, "duration": elapsed, "endpoints": rows}, f, indent=2)
+
+    if server is not None:
+        server.shutdown()
+    if data_dir and not args.keep_data:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    elif data_dir:
+        print(f"data kept in {data_dir}")
+
+
+if __name__ == "__main__":
+    main()